@@ -0,0 +1,175 @@
+"""
+Task activity: archival of old entries and paged history. New entries are written by the
+task endpoints in the transaction of the change they record.
+
+Usage: python -m task_service.activity_log archive [days]   (default: ACTIVITY_RETAIN_DAYS)
+"""
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+import orjson
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from task_service import models, database, versions
+
+# Entries older than this many days are moved to task_activity_archive; 0 disables archival
+ACTIVITY_RETAIN_DAYS = int(os.environ.get("ACTIVITY_RETAIN_DAYS", "365"))
+# Archival runs this long after startup and then once per interval
+ARCHIVE_DELAY = 60.0
+ARCHIVE_INTERVAL = 24 * 3600.0
+# Entries moved per archival transaction
+ARCHIVE_BATCH = 5000
+
+# Columns kept for archived entries
+FIELDS = ["id", "task_id", "user", "action", "detail", "timestamp"]
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityArchiver:
+    """
+    Background thread that moves entries older than `retain_days` to the archive, ARCHIVE_DELAY
+    after start and then every ARCHIVE_INTERVAL. New entries are not buffered: writes insert
+    them with one executemany in their own transaction, so reads never wait on a flush.
+    """
+
+    def __init__(self, retain_days: int = ACTIVITY_RETAIN_DAYS):
+        self.retain_days = retain_days
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def _run(self):
+        next_archive = time.monotonic() + ARCHIVE_DELAY
+        while True:
+            with self._cond:
+                if not self._stopped:
+                    self._cond.wait(max(0.0, next_archive - time.monotonic()))
+                if self._stopped:
+                    return
+            if time.monotonic() < next_archive:
+                continue
+            next_archive = time.monotonic() + ARCHIVE_INTERVAL
+            try:
+                archive_older_than(self.retain_days)
+            except Exception:
+                logger.exception("Activity archival failed")
+
+    def start(self):
+        if not self.retain_days:
+            return
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._stopped = True
+            self._cond.notify()
+        if thread is not None:
+            thread.join()
+
+
+def archive(db: Session, before: datetime) -> int:
+    """
+    Move entries with timestamps before `before` to task_activity_archive, in transactions of
+    ARCHIVE_BATCH entries, packed per task and month. Returns the number of entries moved.
+    """
+    Activity = models.TaskActivity
+    columns = [getattr(Activity, name) for name in FIELDS]
+    moved = 0
+    while True:
+        rows = db.execute(
+            select(*columns).where(Activity.timestamp < before).order_by(Activity.task_id, Activity.id).limit(ARCHIVE_BATCH)
+        ).all()
+        if not rows:
+            return moved
+        chunks = defaultdict(list)
+        for row in rows:
+            entry = dict(zip(FIELDS, row))
+            chunks[(entry.pop("task_id"), entry["timestamp"].strftime("%Y-%m"))].append(entry)
+        db.execute(insert(models.TaskActivityArchive), [
+            {"task_id": task_id, "period": period, "first_id": entries[0]["id"], "last_id": entries[-1]["id"],
+             "count": len(entries), "data": zlib.compress(orjson.dumps(entries))}
+            for (task_id, period), entries in chunks.items()
+        ])
+        db.execute(delete(Activity).where(Activity.id.in_([row.id for row in rows])))
+        task_ids = {task_id for task_id, _ in chunks}
+        # Task responses embed the hot activity, so their ETags must change
+        versions.bump(db, [owner for (owner,) in db.query(models.Task.owner).filter(models.Task.id.in_(task_ids)).distinct()])
+        db.commit()
+        moved += len(rows)
+
+
+def archive_older_than(days: int) -> int:
+    db = database.SessionLocal()
+    try:
+        return archive(db, datetime.utcnow() - timedelta(days=days))
+    finally:
+        db.close()
+
+
+def delete_archived(db: Session, task_ids: list):
+    """Drop archived activity of deleted tasks; runs in the caller's transaction."""
+    Archive = models.TaskActivityArchive
+    db.execute(delete(Archive).where(Archive.task_id.in_(task_ids)))
+
+
+def archived_entries(db: Session, task_id: int, after: Optional[int], limit: Optional[int]) -> list:
+    """Archived entries of a task with ids after `after`, oldest first, at most `limit` of them."""
+    Archive = models.TaskActivityArchive
+    q = db.query(Archive.first_id, Archive.data).filter(Archive.task_id == task_id)
+    if after is not None:
+        q = q.filter(Archive.last_id > after)
+    entries = []
+    for first_id, data in q.order_by(Archive.first_id):
+        # Chunks are ordered by first id, so once `limit` entries precede this one it adds nothing
+        if limit is not None and len(entries) >= limit and first_id > entries[limit - 1]["id"]:
+            break
+        entries.extend(e for e in orjson.loads(zlib.decompress(data)) if after is None or e["id"] > after)
+        entries.sort(key=lambda e: e["id"])
+    return entries[:limit] if limit is not None else entries
+
+
+def history(db: Session, task_id: int, after: Optional[int] = None, limit: Optional[int] = None, archived: bool = False) -> list:
+    """
+    A task's activity ordered by id, as dicts, starting after id `after`. With `archived`,
+    entries moved to the archive are merged in.
+    """
+    Activity = models.TaskActivity
+    names = [name for name in FIELDS if name != "task_id"]
+    q = select(*[getattr(Activity, name) for name in names]).where(Activity.task_id == task_id)
+    if after is not None:
+        q = q.where(Activity.id > after)
+    q = q.order_by(Activity.id)
+    if limit is not None:
+        q = q.limit(limit)
+    entries = [dict(zip(names, row)) for row in db.execute(q)]
+    if archived:
+        entries = sorted(archived_entries(db, task_id, after, limit) + entries, key=lambda e: e["id"])
+        if limit is not None:
+            entries = entries[:limit]
+    return entries
+
+
+archiver = ActivityArchiver()
+atexit.register(archiver.stop)
+
+
+if __name__ == "__main__":
+    # Archival command: python -m task_service.activity_log archive [days]
+    if sys.argv[1:2] != ["archive"]:
+        sys.exit(__doc__.strip())
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else ACTIVITY_RETAIN_DAYS
+    print(f"Archived {archive_older_than(days)} activity entries older than {days} days")
@@ -0,0 +1,113 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from task_service import models
+
+GRANULARITIES = ("hour", "day", "week", "month")
+# Largest number of periods one report may span (about six weeks of hours, 2.7 years of days)
+MAX_PERIODS = 1000
+
+
+def period_start(moment, granularity: str):
+    """Start of the period containing `moment` (a date, or a datetime for hours). Weeks start on Monday."""
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start, granularity: str):
+    if granularity == "hour":
+        return start + timedelta(hours=1)
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def period_label(start, granularity: str) -> str:
+    if granularity == "hour":
+        return start.strftime("%Y-%m-%dT%H:00")
+    if granularity == "month":
+        return start.strftime("%Y-%m")
+    return start.strftime("%Y-%m-%d")
+
+
+def periods(start: datetime, end: datetime, granularity: str) -> list:
+    """Period starts covering start..end inclusive; None when there would be more than MAX_PERIODS."""
+    result = []
+    current = period_start(start, granularity)
+    last = period_start(end, granularity)
+    while current <= last:
+        result.append(current)
+        if len(result) > MAX_PERIODS:
+            return None
+        current = next_period(current, granularity)
+    return result
+
+
+def completion_counts(db: Session, start: datetime, end: datetime, granularity: str, owner: Optional[str] = None, by_owner: bool = False):
+    """
+    {(owner, period start): completed} for tasks completed between start and end; owner is
+    None unless by_owner is set. Day, week and month read the daily completion rollup summed
+    per day in SQL (a year is at most 365 rows per owner); hours read Done tasks through the
+    (status, completed_at) index.
+    """
+    counts = defaultdict(int)
+    if granularity == "hour":
+        Task = models.Task
+        q = db.query(Task.owner, Task.completed_at).filter(
+            Task.status == "Done",
+            Task.completed_at >= period_start(start, "hour"),
+            Task.completed_at < next_period(period_start(end, "hour"), "hour"),
+        )
+        if owner is not None:
+            q = q.filter(Task.owner == owner)
+        for task_owner, completed_at in q:
+            counts[(task_owner if by_owner else None, period_start(completed_at, "hour"))] += 1
+        return counts
+    Rollup = models.DailyCompletionCount
+    keys = [Rollup.owner, Rollup.day] if by_owner else [Rollup.day]
+    q = db.query(*keys, func.sum(Rollup.count)).filter(
+        Rollup.day >= period_start(start, granularity),
+        Rollup.day <= (end.date() if isinstance(end, datetime) else end),
+    )
+    if owner is not None:
+        q = q.filter(Rollup.owner == owner)
+    for row in q.group_by(*keys):
+        day_owner = row[0] if by_owner else None
+        counts[(day_owner, period_start(row[-2], granularity))] += row[-1]
+    return counts
+
+
+def productivity(db: Session, start: datetime, end: datetime, granularity: str = "day", owner: Optional[str] = None, by_owner: bool = False):
+    """
+    Completed tasks per period from start to end, gaps filled with zero. Each item is
+    {"date": label, "completed": n}, plus {"by_owner": {owner: n}} when by_owner is set.
+    Raises ValueError for an unknown granularity or a range longer than MAX_PERIODS.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    starts = periods(start, end, granularity)
+    if starts is None:
+        raise ValueError(f"range spans more than {MAX_PERIODS} {granularity} periods")
+    counts = completion_counts(db, start, end, granularity, owner, by_owner)
+    totals = defaultdict(int)
+    owners = defaultdict(dict)
+    for (task_owner, period), count in counts.items():
+        totals[period] += count
+        owners[period][task_owner] = count
+    result = []
+    for period in starts:
+        item = {"date": period_label(period, granularity), "completed": totals.get(period, 0)}
+        if by_owner:
+            item["by_owner"] = dict(sorted(owners.get(period, {}).items()))
+        result.append(item)
+    return result
@@ -0,0 +1,82 @@
+import functools
+import inspect
+from fastapi import APIRouter, Depends, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute, APIWebSocketRoute
+from pydantic import TypeAdapter
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+
+
+def off_loop(fn, *args, **kwargs):
+    """
+    Call blocking IO that does not go through the request's session (the sync engine, another
+    database). Inside an asyncified endpoint the body runs on the event loop, so the call is
+    handed to the threadpool and awaited from there; anywhere else it is a plain call.
+    """
+    if in_greenlet():
+        return await_only(run_in_threadpool(fn, *args, **kwargs))
+    return fn(*args, **kwargs)
+
+
+def asyncify(endpoint, db_param: str, get_async_db, response_model=None):
+    """
+    Wrap a sync endpoint so it runs on an AsyncSession. The original body is executed through
+    AsyncSession.run_sync, so queries, lazy loads and the response model conversion all go
+    through the async driver instead of occupying a threadpool worker. Side IO in the body
+    must go through off_loop().
+    """
+    signature = inspect.signature(endpoint)
+    params = [
+        p.replace(default=Depends(get_async_db)) if p.name == db_param else p
+        for p in signature.parameters.values()
+    ]
+    adapter = TypeAdapter(response_model) if response_model is not None else None
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        async_db = kwargs.pop(db_param)
+
+        def call(session):
+            result = endpoint(**kwargs, **{db_param: session})
+            # Convert ORM results while still inside run_sync, where lazy loads are allowed
+            if adapter is not None and not isinstance(result, Response):
+                result = adapter.validate_python(result, from_attributes=True)
+            return result
+
+        return await async_db.run_sync(call)
+
+    wrapper.__signature__ = signature.replace(parameters=params)
+    return wrapper
+
+
+def asyncify_router(router: APIRouter, get_db, get_async_db, sync_only=()):
+    """
+    Build a router with the same routes where every endpoint depending on get_db runs on
+    get_async_db instead. Endpoints named in sync_only (e.g. ones that also open sessions on
+    another database) and endpoints without a database dependency are kept as they are.
+    """
+    async_router = APIRouter()
+    for route in router.routes:
+        endpoint = route.endpoint
+        if isinstance(route, APIWebSocketRoute):
+            async_router.add_api_websocket_route(route.path, endpoint, name=route.name)
+            continue
+        if isinstance(route, APIRoute) and endpoint.__name__ not in sync_only:
+            db_param = next(
+                (p.name for p in inspect.signature(endpoint).parameters.values()
+                 if getattr(p.default, "dependency", None) is get_db),
+                None,
+            )
+            if db_param is not None:
+                endpoint = asyncify(endpoint, db_param, get_async_db, route.response_model)
+        async_router.add_api_route(
+            route.path,
+            endpoint,
+            methods=list(route.methods),
+            response_model=route.response_model,
+            response_model_exclude_none=route.response_model_exclude_none,
+            responses=route.responses,
+            status_code=route.status_code,
+            name=route.name,
+        )
+    return async_router
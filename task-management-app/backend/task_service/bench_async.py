@@ -0,0 +1,99 @@
+"""
+Benchmark for DB_MODE: the same endpoints served sync (threadpool, sync engine) and async
+(asyncified routes on the async engine), side by side.
+
+Usage: python -m task_service.bench_async [concurrency...]   (default: 1 10 50)
+
+A throwaway SQLite database is loaded with TASKS tasks through the API. For each
+concurrency, REQUESTS requests per scenario are sent by that many concurrent clients
+through httpx's in-process ASGI transport, to each app in turn. Throughput and median/p95
+latency are reported. No network is involved, so the numbers compare the request
+dispatch and database paths only.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp()
+os.environ["TASKS_DATABASE_URL"] = f"sqlite:///{_tmpdir}/bench_tasks.db"
+# Creates database.async_engine alongside the sync engine
+os.environ["DB_MODE"] = "async"
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from jose import jwt  # noqa: E402
+from task_service import main  # noqa: E402
+from task_service.async_routes import asyncify_router  # noqa: E402
+
+TASKS = 1000
+REQUESTS = 500
+OWNER = "bench"
+SCENARIOS = {
+    "get task": lambda n: ("GET", f"/tasks/{1 + n % TASKS}", None),
+    "list page": lambda n: ("GET", "/tasks", {"params": {"limit": 50, "cursor": n % TASKS}}),
+    "update": lambda n: ("PUT", f"/tasks/{1 + n % TASKS}", {"json": {"progress": n % 101}}),
+}
+
+
+def build_apps():
+    sync_app = FastAPI()
+    sync_app.include_router(main.router)
+    async_app = FastAPI()
+    async_app.include_router(asyncify_router(main.router, main.get_db, main.get_async_db, sync_only=main.SYNC_ONLY))
+    return {"sync": sync_app, "async": async_app}
+
+
+def client(app, headers: dict):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", headers=headers)
+
+
+async def load(app, headers: dict):
+    async with client(app, headers) as c:
+        for start in range(0, TASKS, 500):
+            created = await c.post("/tasks/bulk", json={"tasks": [{"title": f"Task {i}", "description": "Benchmark task"} for i in range(start, min(TASKS, start + 500))]})
+            ids = [item["id"] for item in created.json()["results"]]
+            await c.patch("/tasks/bulk", json={"updates": [{"id": task_id, "status": "In Progress"} for task_id in ids]})
+
+
+async def run(app, headers: dict, scenario, concurrency: int):
+    latencies = []
+    errors = 0
+    counter = iter(range(REQUESTS))
+
+    async def worker(c):
+        nonlocal errors
+        for n in counter:
+            method, url, kwargs = scenario(n)
+            start = time.perf_counter()
+            try:
+                ok = (await c.request(method, url, **(kwargs or {}))).status_code == 200
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    async with client(app, headers) as c:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(c) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return REQUESTS / elapsed, statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95)] * 1000, errors
+
+
+async def bench(concurrencies):
+    headers = {"Authorization": f"Bearer {jwt.encode({'sub': OWNER, 'role': 'User'}, main.SECRET_KEY, algorithm=main.ALGORITHM)}"}
+    apps = build_apps()
+    await load(apps["sync"], headers)
+    print(f"{'scenario':>10} {'clients':>8} {'mode':>6} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'errors':>7}")
+    for concurrency in concurrencies:
+        for name, scenario in SCENARIOS.items():
+            for mode, app in apps.items():
+                rps, p50, p95, errors = await run(app, headers, scenario, concurrency)
+                print(f"{name:>10} {concurrency:>8} {mode:>6} {rps:>8.0f} {p50:>9.2f} {p95:>9.2f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    asyncio.run(bench([int(arg) for arg in sys.argv[1:]] or [1, 10, 50]))
@@ -0,0 +1,86 @@
+"""
+Benchmark for GET /tasks/search: query latency against the full-text index.
+
+Usage: python -m task_service.bench_search [comments...]   (default: 100000 1000000)
+
+Each size is loaded into a throwaway SQLite database with ten comments per task, the index
+kept current by its triggers as in production. Text is drawn from a Zipf-distributed
+vocabulary, so queries range from words in a few documents to words in a tenth of them.
+Every query is run REPEAT times through the search backend, with and without owner
+scoping, and the median time is reported. Latency grows with the number of matches, since
+every match is scored before the best page is picked.
+"""
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+_tmpdir = tempfile.mkdtemp()
+os.environ["TASKS_DATABASE_URL"] = f"sqlite:///{_tmpdir}/bench_tasks.db"
+
+from sqlalchemy import delete, insert  # noqa: E402
+from task_service import database, migrations, models, search  # noqa: E402
+
+COMMENTS_PER_TASK = 10
+OWNERS = 50
+REPEAT = 20
+VOCABULARY = [f"word{rank}" for rank in range(1, 50001)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+# Words by frequency rank: word20000 is in a handful of documents, word10 in about a tenth
+QUERIES = ["word20000", "word2000", "word200", "word20", "word10", "word200 word300", "nosuchword"]
+
+
+def sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=length))
+
+
+def load(comments: int):
+    rng = random.Random(comments)
+    tasks = comments // COMMENTS_PER_TASK
+    now = datetime.utcnow()
+    with database.engine.begin() as conn:
+        for table in (models.TaskComment, models.Task):
+            conn.execute(delete(table))
+        conn.execute(insert(models.Task), [
+            {"id": i, "title": sentence(rng, 4), "description": sentence(rng, 12), "status": "To Do",
+             "owner": f"user{i % OWNERS}", "created_at": now, "progress": 0}
+            for i in range(1, tasks + 1)
+        ])
+        conn.execute(insert(models.TaskComment), [
+            {"task_id": 1 + i // COMMENTS_PER_TASK, "user": f"user{i % OWNERS}", "comment": sentence(rng, 15), "timestamp": now}
+            for i in range(comments)
+        ])
+
+
+def timed(backend, words: list, owner):
+    db = database.SessionLocal()
+    try:
+        samples = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            ids, total = backend.search(db, words, owner, 0, 20)
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples) * 1000, total
+    finally:
+        db.close()
+
+
+def main(sizes):
+    models.Base.metadata.create_all(bind=database.engine)
+    migrations.upgrade(database.engine)
+    backend = search.backend_for(database.engine.dialect.name)
+    print(f"{'comments':>9} {'query':>18} {'scope':>6} {'matches':>8} {'median (ms)':>12}")
+    for size in sizes:
+        load(size)
+        for q in QUERIES:
+            for scope, owner in (("all", None), ("owner", "user7")):
+                ms, total = timed(backend, search.terms(q), owner)
+                print(f"{size:>9} {q:>18} {scope:>6} {total:>8} {ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100000, 1000000])
@@ -0,0 +1,70 @@
+"""
+Benchmark for GET /tasks serialization: ORM + Pydantic path vs the fast_json path.
+
+Usage: python -m task_service.bench_serialization [sizes...]   (default: 1000 10000 100000)
+
+Each size is loaded into a throwaway SQLite database with two comments and two activity
+entries per task, then the full list is streamed both ways, with all fields and with
+fields=summary. Times cover the query, serialization and encoding of the whole response.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+_tmpdir = tempfile.mkdtemp()
+os.environ["TASKS_DATABASE_URL"] = f"sqlite:///{_tmpdir}/bench_tasks.db"
+
+from sqlalchemy import delete, insert  # noqa: E402
+from task_service import database, models, schemas  # noqa: E402
+from task_service.main import parse_fields, stream_tasks  # noqa: E402
+
+CHILDREN_PER_TASK = 2
+
+
+def load(size: int):
+    with database.engine.begin() as conn:
+        for table in (models.TaskComment, models.TaskActivity, models.Task):
+            conn.execute(delete(table))
+        now = datetime.utcnow()
+        conn.execute(insert(models.Task), [
+            {"id": i, "title": f"Task {i}", "description": "Benchmark task " * 4, "status": "In Progress",
+             "owner": f"user{i % 50}", "created_at": now, "progress": i % 100}
+            for i in range(1, size + 1)
+        ])
+        conn.execute(insert(models.TaskComment), [
+            {"task_id": i, "user": f"user{i % 50}", "comment": f"Comment {n} on task {i}", "timestamp": now}
+            for i in range(1, size + 1) for n in range(CHILDREN_PER_TASK)
+        ])
+        conn.execute(insert(models.TaskActivity), [
+            {"task_id": i, "user": f"user{i % 50}", "action": "progress_update", "detail": f"Progress set to {n}", "timestamp": now}
+            for i in range(1, size + 1) for n in range(CHILDREN_PER_TASK)
+        ])
+
+
+def timed(names: set, fast: bool):
+    start = time.perf_counter()
+    body = "".join(stream_tasks([], names, None, None, fast))
+    return time.perf_counter() - start, body
+
+
+def main(sizes):
+    models.Base.metadata.create_all(bind=database.engine)
+    views = {
+        "full": set(schemas.TaskOut.model_fields),
+        "summary": parse_fields("summary"),
+    }
+    print(f"{'tasks':>8} {'view':>8} {'orm (s)':>10} {'fast (s)':>10} {'speedup':>8}")
+    for size in sizes:
+        load(size)
+        for view, names in views.items():
+            orm_time, orm_body = timed(names, fast=False)
+            fast_time, fast_body = timed(names, fast=True)
+            assert json.loads(orm_body) == json.loads(fast_body), "fast path payload differs"
+            print(f"{size:>8} {view:>8} {orm_time:>10.3f} {fast_time:>10.3f} {orm_time / fast_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import orjson
+from sqlalchemy import delete, func, insert, select
+from task_service import models, database
+from task_service.async_routes import off_loop
+
+# "memory" keeps the feed in this process; "database" stores it in change_events so every
+# worker on the same database serves the same feed (a local stand-in for a shared broker)
+CHANGE_FEED_BACKEND = os.environ.get("CHANGE_FEED_BACKEND", "memory")
+# Events kept for Last-Event-ID resume; older offsets get a reset event instead
+CHANGE_FEED_RETAIN = int(os.environ.get("CHANGE_FEED_RETAIN", "10000"))
+# How often subscribers check the shared backend for events written by other workers
+CHANGE_FEED_POLL = float(os.environ.get("CHANGE_FEED_POLL", "1.0"))
+# Seconds without events before a keepalive is sent
+KEEPALIVE = 15.0
+READ_BATCH = 500
+
+
+def event(type: str, owner: str, task_id=None, data=None) -> dict:
+    """A change event; ids are assigned by the backend when it is published."""
+    return {"type": type, "owner": owner, "task_id": task_id, "data": data or {}, "ts": datetime.utcnow()}
+
+
+def dumps(value) -> str:
+    return orjson.dumps(value).decode()
+
+
+class MemoryBackend:
+    """Events in a bounded ring buffer in this process."""
+    shared = False
+
+    def __init__(self, retain: int = CHANGE_FEED_RETAIN):
+        self._events = deque(maxlen=retain)
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def append(self, events: list):
+        with self._lock:
+            for e in events:
+                e["id"] = self._next_id
+                self._next_id += 1
+                self._events.append(e)
+
+    def last_id(self) -> int:
+        with self._lock:
+            return self._next_id - 1
+
+    def read(self, after: int, limit: int = READ_BATCH):
+        """
+        Returns (events after `after`, complete); complete is False when some were already
+        dropped, or when `after` is ahead of the feed (an id from before a restart), in which
+        case reading starts over from the oldest event.
+        """
+        with self._lock:
+            if after >= self._next_id:
+                return self.read_from(0, limit)[0], False
+            return self.read_from(after, limit)
+
+    def read_from(self, after: int, limit: int):
+        if not self._events or self._events[-1]["id"] <= after:
+            return [], True
+        complete = self._events[0]["id"] <= after + 1
+        start = max(0, after + 1 - self._events[0]["id"])
+        return [self._events[i] for i in range(start, min(len(self._events), start + limit))], complete
+
+
+class DatabaseBackend:
+    """Events in the change_events table, pruned to the newest `retain` rows."""
+    shared = True
+
+    def __init__(self, engine=database.engine, retain: int = CHANGE_FEED_RETAIN):
+        self.engine = engine
+        self.retain = retain
+        self._appends = 0
+        models.Base.metadata.create_all(bind=engine, tables=[models.ChangeEvent.__table__])
+
+    def append(self, events: list):
+        table = models.ChangeEvent.__table__
+        with self.engine.begin() as conn:
+            for e in events:
+                e["id"] = conn.execute(
+                    insert(table).values(type=e["type"], owner=e["owner"], task_id=e["task_id"], data=dumps(e["data"]), ts=e["ts"])
+                ).inserted_primary_key[0]
+            self._appends += 1
+            if self._appends % 100 == 0:
+                conn.execute(delete(table).where(table.c.id <= events[-1]["id"] - self.retain))
+
+    def last_id(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.max(models.ChangeEvent.id))).scalar() or 0
+
+    def read(self, after: int, limit: int = READ_BATCH):
+        table = models.ChangeEvent.__table__
+        with self.engine.connect() as conn:
+            oldest, newest = conn.execute(select(func.min(table.c.id), func.max(table.c.id))).one()
+            # Ahead of the feed (the table was emptied): start over from the oldest event
+            ahead = after > (newest or 0)
+            if ahead:
+                after = 0
+            rows = conn.execute(select(table).where(table.c.id > after).order_by(table.c.id).limit(limit)).all()
+        complete = not ahead and (oldest is None or oldest <= after + 1)
+        return [
+            {"id": r.id, "type": r.type, "owner": r.owner, "task_id": r.task_id, "data": orjson.loads(r.data), "ts": r.ts}
+            for r in rows
+        ], complete
+
+
+BACKENDS = {"memory": MemoryBackend, "database": DatabaseBackend}
+
+
+class Broker:
+    """
+    Publishes change events to the backend and wakes subscribers. publish() is called from
+    request threads after commit; subscribe() runs on the event loop of SSE/WebSocket handlers.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._waiters = set()
+        self._lock = threading.Lock()
+
+    def publish(self, events: list):
+        if not events:
+            return
+        if self.backend.shared:
+            off_loop(self.backend.append, events)
+        else:
+            self.backend.append(events)
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, wake in waiters:
+            loop.call_soon_threadsafe(wake.set)
+
+    async def read(self, after: int):
+        if self.backend.shared:
+            return await asyncio.to_thread(self.backend.read, after)
+        return self.backend.read(after)
+
+    async def subscribe(self, after=None, owner=None):
+        """
+        Yield lists of events published after `after` (all new events when None), limited to
+        `owner` when given. An empty list means nothing happened for KEEPALIVE seconds.
+        When `after` is older than the retained history, or ahead of the feed after a restart,
+        a {"type": "reset"} event comes first.
+        """
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        waiter = (loop, wake)
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            if after is None:
+                after = self.backend.last_id()
+            timeout = CHANGE_FEED_POLL if self.backend.shared else KEEPALIVE
+            last_sent = time.monotonic()
+            while True:
+                wake.clear()
+                events, complete = await self.read(after)
+                if not complete:
+                    if after > self.backend.last_id():
+                        # An id from before a restart: the feed has started over
+                        after = 0
+                    yield [{"id": after, "type": "reset", "owner": owner, "task_id": None, "data": {}, "ts": datetime.utcnow()}]
+                if events:
+                    after = events[-1]["id"]
+                    visible = [e for e in events if owner is None or e["owner"] == owner]
+                    if visible:
+                        yield visible
+                        last_sent = time.monotonic()
+                    if len(events) == READ_BATCH:
+                        continue
+                if time.monotonic() - last_sent >= KEEPALIVE:
+                    yield []
+                    last_sent = time.monotonic()
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+broker = Broker(BACKENDS[CHANGE_FEED_BACKEND]())
+
+
+def publish(events: list):
+    broker.publish(events)
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DASHBOARD_CACHE_BACKEND = os.environ.get("DASHBOARD_CACHE_BACKEND", "memory")
+DASHBOARD_CACHE_SIZE = int(os.environ.get("DASHBOARD_CACHE_SIZE", "1024"))
+DASHBOARD_CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", "30"))
+# Longest a request waits for another one computing the same entry before computing it itself
+SINGLE_FLIGHT_TIMEOUT = 10.0
+
+MISSING = object()
+
+
+class CacheBackend:
+    """
+    Storage for cached dashboard responses. Keys are (scope, tag) tuples, where scope is the
+    owner (or None for every owner) the response depends on. A shared backend (e.g. Redis) implements these
+    three methods and must store values that survive serialization (JSON-compatible).
+    """
+
+    def get(self, key):
+        """Return the value, or MISSING when absent or expired."""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl: float):
+        raise NotImplementedError
+
+    def invalidate(self, scopes: set):
+        """Drop every entry whose scope is in `scopes`."""
+        raise NotImplementedError
+
+    def __len__(self):
+        return 0
+
+
+class MemoryBackend(CacheBackend):
+    """Bounded LRU in this process; entries expire after their TTL."""
+
+    def __init__(self, maxsize: int = DASHBOARD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, scopes: set):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in scopes]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+BACKENDS = {"memory": MemoryBackend}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = MISSING
+
+
+class DashboardCache:
+    """
+    Read-through cache for dashboard responses with single-flight: concurrent misses on
+    one key compute it once and the others wait for that result.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = DASHBOARD_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        value = self.backend.get(key)
+        if value is not MISSING:
+            with self._lock:
+                self.hits += 1
+            return value
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+        # On the event loop (async mode) waiting would block the leader too, so compute instead
+        if not leader and not _on_event_loop():
+            flight.done.wait(SINGLE_FLIGHT_TIMEOUT)
+            if flight.value is not MISSING:
+                with self._lock:
+                    self.coalesced += 1
+                return flight.value
+        if not leader:
+            with self._lock:
+                self.misses += 1
+            return compute()
+        try:
+            flight.value = compute()
+            self.backend.set(key, flight.value, self.ttl)
+            return flight.value
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, scopes):
+        self.backend.invalidate(set(scopes))
+
+    def stats(self):
+        with self._lock:
+            served = self.hits + self.coalesced
+            total = served + self.misses
+            return {
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": served / total if total else 0.0,
+                "size": len(self.backend),
+            }
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+cache = DashboardCache(BACKENDS[DASHBOARD_CACHE_BACKEND]())
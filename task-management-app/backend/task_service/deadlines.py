@@ -0,0 +1,103 @@
+import heapq
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from task_service import models, changes
+
+# "task.due_soon" is published this long before a deadline; "task.overdue" at the deadline
+DUE_SOON_LEAD = timedelta(minutes=int(os.environ.get("DUE_SOON_LEAD_MINUTES", "60")))
+
+
+class DeadlineScheduler:
+    """
+    Min-heap of upcoming due-soon/overdue moments for open tasks, kept current by the write
+    paths through track()/untrack(). A daemon thread sleeps until the earliest one and
+    publishes it to the change feed, so notifications never poll the tasks table.
+    Heap entries are (fire_at, kind, task_id, generation); entries made stale by a later
+    track() or untrack() of the same task are skipped when they come up.
+    """
+
+    def __init__(self, publish=changes.publish, lead: timedelta = DUE_SOON_LEAD, clock=datetime.utcnow):
+        self.publish = publish
+        self.lead = lead
+        self.clock = clock
+        self._heap = []
+        self._tasks = {}  # task_id -> (generation, owner, title, deadline)
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def track(self, task_id: int, owner: str, title: str, deadline, status: str):
+        """Schedule (or reschedule) a task; tasks without a deadline or already Done are dropped."""
+        with self._cond:
+            self._generation += 1
+            if deadline is None or status == "Done":
+                self._tasks.pop(task_id, None)
+                return
+            generation = self._generation
+            self._tasks[task_id] = (generation, owner, title, deadline)
+            now = self.clock()
+            if deadline - self.lead > now:
+                heapq.heappush(self._heap, (deadline - self.lead, "task.due_soon", task_id, generation))
+            if deadline > now:
+                heapq.heappush(self._heap, (deadline, "task.overdue", task_id, generation))
+            self._cond.notify()
+
+    def untrack(self, task_id: int):
+        self.track(task_id, None, None, None, None)
+
+    def load(self, db: Session):
+        """Track every open task whose deadline is still ahead; run once at startup."""
+        Task = models.Task
+        rows = db.query(Task.id, Task.owner, Task.title, Task.deadline, Task.status).filter(
+            Task.deadline > self.clock(), Task.status != "Done"
+        )
+        for row in rows:
+            self.track(row.id, row.owner, row.title, row.deadline, row.status)
+
+    def pop_due(self):
+        """Remove and return the events whose time has come."""
+        events = []
+        with self._cond:
+            now = self.clock()
+            while self._heap and self._heap[0][0] <= now:
+                _, kind, task_id, generation = heapq.heappop(self._heap)
+                tracked = self._tasks.get(task_id)
+                if tracked is None or tracked[0] != generation:
+                    continue
+                _, owner, title, deadline = tracked
+                if kind == "task.overdue":
+                    del self._tasks[task_id]
+                events.append(changes.event(kind, owner, task_id, {"id": task_id, "title": title, "deadline": deadline}))
+        return events
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                if not self._heap or self._heap[0][0] > self.clock():
+                    timeout = (self._heap[0][0] - self.clock()).total_seconds() if self._heap else None
+                    self._cond.wait(timeout)
+                    continue
+            self.publish(self.pop_due())
+
+    def start(self):
+        with self._cond:
+            self._stopped = False
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+scheduler = DeadlineScheduler()
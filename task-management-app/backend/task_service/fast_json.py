@@ -0,0 +1,44 @@
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from task_service import models, schemas
+
+# Child tables per include section, with the columns their Out schemas expose
+CHILD_TABLES = {
+    "comments": (models.TaskComment, list(schemas.TaskCommentOut.model_fields)),
+    "activity": (models.TaskActivity, list(schemas.TaskActivityOut.model_fields)),
+}
+
+
+def task_rows(db: Session, columns: list, sections: dict, filters: list, after, limit: int):
+    """
+    One keyset batch of tasks as plain dicts, built straight from Row tuples: no ORM
+    identity map and no per-row Pydantic validation. `sections` maps each include
+    section to the key it is returned under. Children are fetched with one IN query
+    per section.
+    """
+    stmt = select(*[getattr(models.Task, name) for name in columns]).where(*filters)
+    if after is not None:
+        stmt = stmt.where(models.Task.id > after)
+    rows = db.execute(stmt.order_by(models.Task.id).limit(limit)).all()
+    tasks = [dict(zip(columns, row)) for row in rows]
+    if not tasks or not sections:
+        return tasks
+    by_id = {task["id"]: task for task in tasks}
+    for section, key in sections.items():
+        model, fields = CHILD_TABLES[section]
+        for task in tasks:
+            task[key] = []
+        child_rows = db.execute(
+            select(model.task_id, *[getattr(model, name) for name in fields])
+            .where(model.task_id.in_(list(by_id)))
+            .order_by(model.id)
+        )
+        for task_id, *values in child_rows:
+            by_id[task_id][key].append(dict(zip(fields, values)))
+    return tasks
+
+
+def dumps_items(items: list) -> str:
+    """Encode a list of dicts as the comma-separated body of a JSON array (no brackets)."""
+    return orjson.dumps(items)[1:-1].decode()
@@ -1,19 +1,50 @@
-from sqlalchemy import func, case, and_, or_
+from sqlalchemy import func, case, and_, or_, insert, select, literal, cast, String, union_all
 from datetime import datetime, timedelta
-from fastapi import FastAPI, Depends, HTTPException, status, Header
-from sqlalchemy.orm import Session
+from typing import Optional
+import functools
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, BackgroundTasks, Depends, HTTPException, status, Header, Query, Response, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session, selectinload, noload, load_only
 from jose import jwt, JWTError
-from task_service import models, schemas, database
+from pydantic import create_model
+from task_service import models, schemas, database, rollups, migrations, user_deletion, fast_json, changes, versions, dashboard_cache, analytics, deadlines, search, activity_log, repository
+from task_service.async_routes import asyncify_router
 from user_service import models as user_models, database as user_database
+from user_service.token_cache import TokenCache
 # from . import models, schemas, database
 from fastapi.middleware.cors import CORSMiddleware
 
 SECRET_KEY = "your-very-secret-key"
 ALGORITHM = "HS256"
+token_cache = TokenCache(SECRET_KEY, ALGORITHM)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Finish user deletions interrupted by a previous shutdown or crash
+    threading.Thread(target=user_deletion.resume_pending, daemon=True).start()
+    db = database.SessionLocal()
+    try:
+        deadlines.scheduler.load(db)
+    finally:
+        db.close()
+    deadlines.scheduler.start()
+    activity_log.archiver.start()
+    yield
+    deadlines.scheduler.stop()
+    activity_log.archiver.stop()
+
+app = FastAPI(lifespan=lifespan)
+router = APIRouter()
 
 models.Base.metadata.create_all(bind=database.engine)
+migrations.upgrade(database.engine)
+_startup_db = database.SessionLocal()
+try:
+    rollups.ensure_backfilled(_startup_db)
+finally:
+    _startup_db.close()
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +52,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
 )
 
 origins = [
@@ -35,26 +67,57 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with database.AsyncSessionLocal() as db:
+        yield db
+
 def get_current_user_and_role(authorization: str = Header(...)):
     try:
         scheme, token = authorization.split()
         if scheme.lower() != "bearer":
             raise ValueError("Not Bearer token")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        role: str = payload.get("role", "User")
+        username, role = token_cache.decode(token)
         if not username:
             raise HTTPException(status_code=401, detail="Invalid token")
         return username, role
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or missing JWT")
 
-# @app.post("/tasks", response_model=schemas.TaskOut)
-@app.post("/tasks", response_model=schemas.TaskOut)
-def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role)):
+class NotModified(Exception):
+    def __init__(self, etag: str):
+        self.etag = etag
+
+@app.exception_handler(NotModified)
+def not_modified(request: Request, exc: NotModified):
+    return Response(status_code=304, headers={"ETag": exc.etag})
+
+def read_scope(username: str, role: str, user: Optional[str] = None) -> Optional[str]:
+    """
+    The owner a read is limited to, which is also whose version it depends on: the caller, or
+    for Admin the selected user or versions.ALL (None, no filter). Only the role lifts the filter.
+    """
+    if role == "Admin":
+        return user or versions.ALL
+    return username
+
+def check_etag(db: Session, request: Request, scope: Optional[str], *parts) -> str:
+    """
+    Weak ETag for this read, from the scope's version row and the request URL; the tasks
+    table is not touched. Raises NotModified (answered with 304) when If-None-Match has it.
+    """
+    tag = versions.etag(db, scope, request.url.path, request.url.query, *parts)
+    if versions.matches(request.headers.get("if-none-match"), tag):
+        raise NotModified(tag)
+    return tag
+
+# @router.post("/tasks", response_model=schemas.TaskOut)
+@router.post("/tasks", response_model=schemas.TaskOut)
+def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role), prefer: Optional[str] = Header(default=None)):
     """
     Create a new task for the authenticated user, or for any user if Admin.
     If admin, can specify owner in the request body.
+    The response is built from the INSERT's returned values, without reading the task back.
+    With `Prefer: return=minimal` only {"id", "status"} is returned.
     """
     username, role = user_and_role
     # If admin and task.owner is provided, use it. Otherwise, use current user.
@@ -65,90 +128,463 @@ def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db), user_an
             description=task.description,
             status=task.status if task.status else "To Do",
             progress=0,  # Always set to 0 for new tasks
-            owner=task_owner
+            owner=task_owner,
+            deadline=task.deadline,
         )
         db.add(db_task)
+        rollups.task_changed(db, None, rollups.snapshot(db_task))
+        versions.bump(db, [task_owner])
+        db.flush()
+        data = task_data(db_task)
         db.commit()
-        db.refresh(db_task)
-        return db_task
+        changes.publish([changes.event("task.created", task_owner, data["id"], data)])
+        track_deadline(data)
+        if minimal_return(prefer):
+            return write_ack(data["id"], "created")
+        return {**data, "comments": [], "activity_log": []}
     except Exception as e:
         print("Error creating task:", e)
         raise HTTPException(status_code=400, detail=f"Failed to create task: {e}")
+# --- BULK ENDPOINTS ---
+# Declared before the /tasks/{task_id} routes so "bulk" is not taken for a task id.
+@router.post("/tasks/bulk", response_model=schemas.BulkResult)
+def create_tasks_bulk(payload: schemas.TaskBulkCreate, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role)):
+    """Create many tasks with one multi-row INSERT in a single transaction."""
+    username, role = user_and_role
+    rows = [
+        dict(
+            title=task.title,
+            description=task.description,
+            status=task.status if task.status else "To Do",
+            progress=0,
+            owner=task.owner if (role == "Admin" and task.owner) else username,
+            deadline=task.deadline,
+        )
+        for task in payload.tasks
+    ]
+    if not rows:
+        return {"results": []}
+    if db.get_bind().dialect.insert_returning:
+        returning = [getattr(models.Task, name) for name in TASK_COLUMNS]
+        created = [dict(row) for row in db.execute(insert(models.Task).returning(*returning, sort_by_parameter_order=True), rows).mappings()]
+    else:
+        # One INSERT per task through the ORM, which takes ids from the cursor (eager_defaults reads created_at)
+        tasks = [models.Task(**row) for row in rows]
+        db.add_all(tasks)
+        db.flush()
+        created = [task_data(task) for task in tasks]
+    rollups.tasks_changed(db, [(None, rollups.snapshot(models.Task(**row))) for row in rows])
+    versions.bump(db, [row["owner"] for row in rows])
+    db.commit()
+    changes.publish([changes.event("task.created", task["owner"], task["id"], task) for task in created])
+    for task in created:
+        track_deadline(task)
+    return {"results": [{"id": task["id"], "status": "created"} for task in created]}
+
+@router.patch("/tasks/bulk", response_model=schemas.BulkResult)
+def update_tasks_bulk(payload: schemas.TaskBulkUpdate, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role)):
+    """
+    Apply many TaskUpdates with the same rules as PUT /tasks/{id}. Tasks are loaded with one
+    IN query, changed rows are flushed together and comment and activity rows are bulk
+    inserted, all in one transaction.
+    Ids that are missing or not visible are reported per item; everything else commits at once.
+    """
+    username, role = user_and_role
+    tasks = repository.visible_tasks(db, [item.id for item in payload.updates], username, role, for_update=True)
+    results, updates, activity_entries, comments = [], [], [], []
+    for item in payload.updates:
+        db_task = tasks.get(item.id)
+        if db_task is None:
+            results.append({"id": item.id, "status": "error", "detail": "Task not found"})
+            continue
+        before = rollups.snapshot(db_task)
+        entries, new_comments = apply_task_update(db_task, item, username)
+        activity_entries.extend(entries)
+        comments.extend(new_comments)
+        updates.append((before, rollups.snapshot(db_task)))
+        results.append({"id": item.id, "status": "updated"})
+    db.flush()
+    write_comments(db, comments)
+    if activity_entries:
+        db.execute(insert(models.TaskActivity), activity_entries)
+    rollups.tasks_changed(db, updates)
+    # Comment authors' dashboard counts change along with the task owners' data
+    versions.bump(db, [tasks[item["id"]].owner for item in results if item["status"] == "updated"] + [c["user"] for c in comments])
+    # Built before commit, which would expire the loaded tasks
+    events = [task_event("task.updated", tasks[item["id"]]) for item in results if item["status"] == "updated"]
+    events += child_events(tasks, activity_entries, comments)
+    db.commit()
+    changes.publish(events)
+    for event in events:
+        if event["type"] == "task.updated":
+            track_deadline(event["data"])
+    return {"results": results}
+
+@router.delete("/tasks/bulk", response_model=schemas.BulkResult)
+def delete_tasks_bulk(payload: schemas.TaskBulkDelete, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role)):
+    """Delete many tasks and their comments/activity with set-based deletes in one transaction."""
+    username, role = user_and_role
+    visible = repository.visible_tasks(db, payload.ids, username, role, repository.DELETE_COLUMNS, for_update=True)
+    removed = {}
+    if visible:
+        commenters = rollups.comments_removed(db, list(visible))
+        removed = {task_id: visible[task_id] for task_id in repository.delete_tasks(db, list(visible))}
+        rollups.tasks_changed(db, [(rollups.snapshot(row), None) for row in removed.values()])
+        versions.bump(db, [row.owner for row in removed.values()] + commenters)
+        db.commit()
+        changes.publish([changes.event("task.deleted", row.owner, row.id, {"id": row.id}) for row in removed.values()])
+        for task_id in removed:
+            deadlines.scheduler.untrack(task_id)
+    return {"results": [
+        {"id": task_id, "status": "deleted"} if task_id in removed else {"id": task_id, "status": "error", "detail": "Task not found"}
+        for task_id in payload.ids
+    ]}
+
 # Endpoint to delete a user (admin only)
-@app.delete("/users/{username}")
-def delete_user(username: str, user_and_role: tuple = Depends(get_current_user_and_role), db: Session = Depends(get_db)):
+@router.delete("/users/{username}")
+def delete_user(username: str, background_tasks: BackgroundTasks, background: bool = False, user_and_role: tuple = Depends(get_current_user_and_role), db: Session = Depends(get_db)):
+    """
+    Delete a user with all their tasks, comments and activity, in bounded chunks.
+    With ?background=true the purge runs after the response (202); follow it at /users/{username}/deletion.
+    While a purge of the user is already running, 409 points there instead.
+    """
     _, role = user_and_role
     if role != "Admin":
         raise HTTPException(status_code=403, detail="Only admin can delete users")
     user_db = user_database.SessionLocal()
     try:
-        user = user_db.query(user_models.User).filter(user_models.User.username == username).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        # Delete all tasks for this user
-        db.query(models.Task).filter(models.Task.owner == username).delete()
-        db.commit()
-        user_db.delete(user)
-        user_db.commit()
-        return {"detail": f"User '{username}' and their tasks deleted"}
+        user = user_db.query(user_models.User.id).filter(user_models.User.username == username).first()
     finally:
         user_db.close()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    progress = f"/users/{username}/deletion"
+    in_progress = JSONResponse(status_code=409, content={"detail": f"Deletion of user '{username}' is already in progress", "progress": progress})
+    # Restarting the job row would reset the progress of the purge that is running
+    if user_deletion.running(username):
+        return in_progress
+    user_deletion.start(db, username)
+    if background:
+        background_tasks.add_task(user_deletion.run, username)
+        return JSONResponse(status_code=202, content={"detail": f"Deletion of user '{username}' started", "progress": progress})
+    if not user_deletion.run(username):
+        return in_progress
+    return {"detail": f"User '{username}' and their tasks deleted"}
+
+@router.get("/users/{username}/deletion")
+def get_user_deletion(username: str, user_and_role: tuple = Depends(get_current_user_and_role), db: Session = Depends(get_db)):
+    _, role = user_and_role
+    if role != "Admin":
+        raise HTTPException(status_code=403, detail="Only admin can view user deletions")
+    job = db.get(models.UserDeletion, username)
+    if not job:
+        raise HTTPException(status_code=404, detail="No deletion found for user")
+    return {
+        "username": job.username,
+        "status": job.status,
+        "tasks_total": job.tasks_total,
+        "tasks_deleted": job.tasks_deleted,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# --- CHANGE FEED ---
+# Declared before the /tasks/{task_id} routes so "changes" is not taken for a task id.
+def feed_owner(authorization: Optional[str], token: Optional[str], user: Optional[str]):
+    """
+    Owner whose events a subscriber receives: their own, or for Admin the given user (None for all).
+    Browsers cannot set headers on EventSource/WebSocket, so the JWT may also come as ?token=.
+    """
+    if token:
+        authorization = f"Bearer {token}"
+    username, role = get_current_user_and_role(authorization or "")
+    return user if role == "Admin" else username
+
+@router.get("/tasks/changes")
+async def task_changes(
+    user: Optional[str] = None,
+    token: Optional[str] = None,
+    last_event_id: Optional[int] = None,
+    authorization: Optional[str] = Header(default=None),
+    last_event_id_header: Optional[int] = Header(default=None, alias="last-event-id"),
+):
+    """
+    Server-sent events for task, comment and activity changes visible to the caller.
+    Reconnects resume after Last-Event-ID (header or ?last_event_id=); a `reset` event means
+    that offset is no longer retained and the client should reload.
+    """
+    owner = feed_owner(authorization, token, user)
+    after = last_event_id_header if last_event_id_header is not None else last_event_id
+
+    async def stream():
+        subscription = changes.broker.subscribe(after, owner)
+        try:
+            yield "retry: 3000\n\n"
+            async for events in subscription:
+                if not events:
+                    yield ": keepalive\n\n"
+                for e in events:
+                    yield f"id: {e['id']}\nevent: {e['type']}\ndata: {changes.dumps(e)}\n\n"
+        finally:
+            await subscription.aclose()
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.websocket("/tasks/changes/ws")
+async def task_changes_ws(websocket: WebSocket, user: Optional[str] = None, token: Optional[str] = None, last_event_id: Optional[int] = None):
+    """The /tasks/changes feed over a WebSocket, one JSON message per event."""
+    try:
+        owner = feed_owner(None, token, user)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    subscription = changes.broker.subscribe(last_event_id, owner)
+    try:
+        async for events in subscription:
+            if not events:
+                await websocket.send_text('{"type": "keepalive"}')
+            for e in events:
+                await websocket.send_text(changes.dumps(e))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await subscription.aclose()
+
+# Rows fetched per keyset batch while streaming /tasks, and the largest page a client may request.
+TASKS_STREAM_BATCH = 500
+TASKS_PAGE_MAX = 1000
+TASK_SECTIONS = {"comments": "comments", "activity": "activity_log"}
+TASK_RELATIONSHIPS = {attr: section for section, attr in TASK_SECTIONS.items()}
+TASK_COLUMNS = [name for name in schemas.TaskOut.model_fields if name not in TASK_RELATIONSHIPS]
+
+def parse_sections(include: str):
+    sections = {s.strip() for s in include.split(",") if s.strip()}
+    unknown = sections - set(TASK_SECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include section(s): {', '.join(sorted(unknown))}")
+    return sections
+
+def parse_fields(fields: str):
+    """
+    TaskOut field names for a `fields` parameter. "summary" stands for the TaskSummary fields;
+    id is always returned since it is the pagination key.
+    """
+    names = {"id"}
+    for name in (f.strip() for f in fields.split(",")):
+        if name == "summary":
+            names.update(schemas.TaskSummary.model_fields)
+        elif name:
+            names.add(name)
+    unknown = names - set(schemas.TaskOut.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(sorted(unknown))}")
+    return names
+
+@functools.lru_cache(maxsize=128)
+def task_model(fields: tuple):
+    """Response model holding only the given TaskOut fields."""
+    if fields == tuple(schemas.TaskOut.model_fields):
+        return schemas.TaskOut
+    if fields == tuple(schemas.TaskSummary.model_fields):
+        return schemas.TaskSummary
+    definitions = {name: (info.annotation, info) for name, info in schemas.TaskOut.model_fields.items() if name in fields}
+    return create_model("TaskFields", **definitions)
+
+def task_view(names: set):
+    """(columns, sections, response model) for a set of TaskOut field names."""
+    fields = tuple(name for name in schemas.TaskOut.model_fields if name in names)
+    columns = [name for name in fields if name not in TASK_RELATIONSHIPS]
+    sections = {TASK_RELATIONSHIPS[name] for name in fields if name in TASK_RELATIONSHIPS}
+    return columns, sections, task_model(fields)
+
+def task_query(db: Session, sections: set, columns: Optional[list] = None):
+    """
+    Query for tasks that batch-loads the requested child collections and skips the rest.
+    With `columns`, only those task columns are selected.
+    """
+    q = db.query(models.Task)
+    if columns is not None:
+        q = q.options(load_only(*[getattr(models.Task, name) for name in columns]))
+    for section, attr in TASK_SECTIONS.items():
+        rel = getattr(models.Task, attr)
+        q = q.options(selectinload(rel) if section in sections else noload(rel))
+    return q
 
+def serialize_task(task: models.Task, model) -> str:
+    return model.model_validate(task, from_attributes=True).model_dump_json()
 
-@app.get("/tasks", response_model=list[schemas.TaskOut])
-def get_tasks(db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role), user: str = None):
+def stream_tasks(filters: list, names: set, after: Optional[int], limit: Optional[int], fast: bool = False):
+    """
+    Yield a JSON array of tasks, walking the table in keyset batches on id.
+    Uses its own session so the stream does not depend on the request-scoped one.
+    With `fast`, batches are read as plain rows and encoded with orjson (see fast_json).
+    """
+    columns, sections, model = task_view(names)
+    db = database.SessionLocal()
+    try:
+        yield "["
+        first = True
+        remaining = limit
+        while remaining is None or remaining > 0:
+            batch_size = TASKS_STREAM_BATCH if remaining is None else min(TASKS_STREAM_BATCH, remaining)
+            if fast:
+                batch = fast_json.task_rows(db, columns, {s: TASK_SECTIONS[s] for s in sections}, filters, after, batch_size)
+                if batch:
+                    yield ("" if first else ",") + fast_json.dumps_items(batch)
+                    first = False
+            else:
+                q = task_query(db, sections, columns).filter(*filters)
+                if after is not None:
+                    q = q.filter(models.Task.id > after)
+                batch = q.order_by(models.Task.id).limit(batch_size).all()
+                for task in batch:
+                    yield ("" if first else ",") + serialize_task(task, model)
+                    first = False
+            if len(batch) < batch_size:
+                break
+            after = batch[-1]["id"] if fast else batch[-1].id
+            if remaining is not None:
+                remaining -= len(batch)
+            db.expunge_all()
+        yield "]"
+    finally:
+        db.close()
+
+# The list is streamed, so it is documented here rather than validated through response_model
+@router.get("/tasks", responses={200: {"model": list[schemas.TaskOut]}})
+def get_tasks(
+    request: Request,
+    db: Session = Depends(get_db),
+    user_and_role: tuple = Depends(get_current_user_and_role),
+    user: str = None,
+    status_filter: Optional[str] = Query(default=None, alias="status"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    completed_from: Optional[datetime] = None,
+    completed_to: Optional[datetime] = None,
+    include: str = "comments,activity",
+    fields: Optional[str] = None,
+    fast: bool = False,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=TASKS_PAGE_MAX),
+):
+    """
+    List tasks ordered by id (ids follow created_at, so this is also creation order).
+    Without `limit` the full result is streamed in keyset batches. With `limit` a single page
+    is returned and the cursor for the next page, if any, is sent in the X-Next-Cursor header.
+    `include` selects which child collections to embed; pass an empty value to leave them out.
+    `fields` (e.g. "summary" or "id,title,status") selects exactly which task fields are loaded
+    and returned, relationships included, and takes precedence over `include`.
+    `fast` skips the ORM and response models and encodes rows directly; same payload, less CPU.
+    """
     username, role = user_and_role
-    if role == "Admin" and user:
-        return db.query(models.Task).filter(models.Task.owner == user).all()
-    elif role == "Admin":
-        return db.query(models.Task).all()
+    if fields is not None:
+        names = parse_fields(fields)
     else:
-        return db.query(models.Task).filter(models.Task.owner == username).all()
+        names = set(TASK_COLUMNS) | {TASK_SECTIONS[section] for section in parse_sections(include)}
+    filters = repository.list_filters(username, role, user)
+    if status_filter:
+        filters.append(models.Task.status == status_filter)
+    if created_from:
+        filters.append(models.Task.created_at >= schemas.naive_utc(created_from))
+    if created_to:
+        filters.append(models.Task.created_at <= schemas.naive_utc(created_to))
+    if completed_from:
+        filters.append(models.Task.completed_at >= schemas.naive_utc(completed_from))
+    if completed_to:
+        filters.append(models.Task.completed_at <= schemas.naive_utc(completed_to))
+
+    headers = {"ETag": check_etag(db, request, read_scope(username, role, user))}
+    if limit is not None:
+        # Probe one id past the page to know whether another page exists
+        q = db.query(models.Task.id).filter(*filters)
+        if cursor is not None:
+            q = q.filter(models.Task.id > cursor)
+        ids = [row[0] for row in q.order_by(models.Task.id).limit(limit + 1).all()]
+        if len(ids) > limit:
+            headers["X-Next-Cursor"] = str(ids[limit - 1])
+    return StreamingResponse(stream_tasks(filters, names, cursor, limit, fast), media_type="application/json", headers=headers)
 
-@app.get("/tasks/{task_id}", response_model=schemas.TaskOut)
-def get_task(task_id: int, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role)):
+SEARCH_PAGE_MAX = 100
+
+@router.get("/tasks/search")
+def search_tasks(
+    request: Request,
+    q: str,
+    db: Session = Depends(get_db),
+    user_and_role: tuple = Depends(get_current_user_and_role),
+    user: str = None,
+    fields: Optional[str] = None,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=20, ge=1, le=SEARCH_PAGE_MAX),
+):
+    """
+    Tasks matching every word of `q` in their title, description or one of their comments,
+    best match first, from the database's full-text index (see search). Scoped like
+    GET /tasks; paginated with offset/limit, with the number of matches in X-Total-Count.
+    `fields` selects the returned task fields as for GET /tasks.
+    """
     username, role = user_and_role
-    if role == "Admin":
-        task = db.query(models.Task).filter(models.Task.id == task_id).first()
+    backend = search.backend_for(db.get_bind().dialect.name)
+    if backend is None:
+        raise HTTPException(status_code=501, detail="Search is not available for this database")
+    words = search.terms(q)
+    if not words:
+        raise HTTPException(status_code=400, detail="q must contain at least one word")
+    names = parse_fields(fields) if fields is not None else set(schemas.TaskOut.model_fields)
+    scope = read_scope(username, role, user)
+    headers = {"ETag": check_etag(db, request, scope)}
+    ids, total = backend.search(db, words, scope, offset, limit)
+    headers["X-Total-Count"] = str(total)
+    columns, sections, model = task_view(names)
+    tasks = {task.id: task for task in task_query(db, sections, columns).filter(models.Task.id.in_(ids))}
+    body = "[" + ",".join(serialize_task(tasks[task_id], model) for task_id in ids if task_id in tasks) + "]"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/tasks/{task_id}", response_model=schemas.TaskOut)
+def get_task(task_id: int, request: Request, response: Response, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role), fields: Optional[str] = None):
+    username, role = user_and_role
+    response.headers["ETag"] = check_etag(db, request, read_scope(username, role))
+    if fields is not None:
+        columns, sections, model = task_view(parse_fields(fields))
+        task = repository.get_task(db, task_id, username, role, sections, columns)
     else:
-        task = db.query(models.Task).filter(models.Task.id == task_id, models.Task.owner == username).first()
+        task = repository.get_task(db, task_id, username, role, TASK_SECTIONS)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    if fields is not None:
+        return Response(content=serialize_task(task, model), media_type="application/json", headers={"ETag": response.headers["ETag"]})
     return task
 
 from datetime import datetime
 
-@app.put("/tasks/{task_id}", response_model=schemas.TaskOut)
-@app.put("/tasks/{task_id}", response_model=schemas.TaskOut)
-def update_task(task_id: int, update: schemas.TaskUpdate, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role)):
-    username, role = user_and_role
-    if role == "Admin":
-        db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    else:
-        db_task = db.query(models.Task).filter(models.Task.id == task_id, models.Task.owner == username).first()
-    if not db_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-
+def apply_task_update(db_task: models.Task, update: schemas.TaskUpdate, username: str):
+    """
+    Apply a TaskUpdate to a loaded task following the status/progress rules.
+    Returns the (activity_entries, comments) rows to insert; the caller writes them.
+    """
     activity_entries = []
     # Track changes for activity log
     if update.title is not None and update.title != db_task.title:
         old = db_task.title
         db_task.title = update.title
-        activity_entries.append(models.TaskActivity(
-            task_id=task_id, user=username, action="title_change", detail=f"Title changed from '{old}' to '{update.title}'"
+        activity_entries.append(dict(
+            task_id=db_task.id, user=username, action="title_change", detail=f"Title changed from '{old}' to '{update.title}'"
         ))
     if update.description is not None and update.description != db_task.description:
         old = db_task.description
         db_task.description = update.description
-        activity_entries.append(models.TaskActivity(
-            task_id=task_id, user=username, action="description_change", detail=f"Description changed."
+        activity_entries.append(dict(
+            task_id=db_task.id, user=username, action="description_change", detail=f"Description changed."
         ))
 
     if update.status is not None and update.status != db_task.status:
         prev_status = db_task.status
         db_task.status = update.status
-        activity_entries.append(models.TaskActivity(
-            task_id=task_id, user=username, action="status_change", detail=f"Status changed from '{prev_status}' to '{update.status}'"
+        activity_entries.append(dict(
+            task_id=db_task.id, user=username, action="status_change", detail=f"Status changed from '{prev_status}' to '{update.status}'"
         ))
 
         if update.status == "In Progress":
@@ -179,47 +615,146 @@ def update_task(task_id: int, update: schemas.TaskUpdate, db: Session = Depends(
             if update.progress != db_task.progress:
                 old = db_task.progress
                 db_task.progress = update.progress
-                activity_entries.append(models.TaskActivity(
-                    task_id=task_id, user=username, action="progress_update", detail=f"Progress changed from {old}% to {update.progress}%"
+                activity_entries.append(dict(
+                    task_id=db_task.id, user=username, action="progress_update", detail=f"Progress changed from {old}% to {update.progress}%"
                 ))
         else:
             raise HTTPException(status_code=400, detail="Progress must be between 0 and 100")
 
+    if "deadline" in update.model_fields_set and update.deadline != db_task.deadline:
+        db_task.deadline = update.deadline
+        detail = f"Deadline set to {update.deadline.isoformat()}" if update.deadline else "Deadline cleared"
+        activity_entries.append(dict(
+            task_id=db_task.id, user=username, action="deadline_change", detail=detail
+        ))
+
     # Handle new comment
+    comments = []
     if update.comment:
-        comment_obj = models.TaskComment(
-            task_id=task_id, user=username, comment=update.comment
-        )
-        db.add(comment_obj)
-        activity_entries.append(models.TaskActivity(
-            task_id=task_id, user=username, action="comment", detail=f"Commented: {update.comment}"
+        comments.append(dict(
+            task_id=db_task.id, user=username, comment=update.comment
+        ))
+        activity_entries.append(dict(
+            task_id=db_task.id, user=username, action="comment", detail=f"Commented: {update.comment}"
         ))
 
-    # Add all activity log entries
-    for entry in activity_entries:
-        db.add(entry)
+    return activity_entries, comments
 
+def write_comments(db: Session, comments: list, returning: bool = False) -> list:
+    """
+    Insert comment rows with one executemany and count them. With `returning`, the inserted
+    rows (ids and timestamps included) are returned, see insert_returning.
+    """
+    if not comments:
+        return []
+    rollups.comments_added(db, [c["user"] for c in comments])
+    if not returning:
+        db.execute(insert(models.TaskComment), comments)
+        return comments
+    return insert_returning(db, models.TaskComment, comments)
+
+def insert_returning(db: Session, model, rows: list) -> list:
+    """
+    Insert comment or activity rows and return them as dicts (ids and timestamps included), in
+    the order of `rows`, without reading them back. Uses INSERT ... RETURNING; databases
+    without it get the rows stamped here and inserted through the ORM, which takes each new
+    id from the cursor.
+    """
+    if not rows:
+        return []
+    if db.get_bind().dialect.insert_returning:
+        stmt = insert(model).returning(*model.__table__.columns, sort_by_parameter_order=True)
+        return [dict(row) for row in db.execute(stmt, rows).mappings()]
+    now = datetime.utcnow()
+    objects = [model(**{"timestamp": now, **row}) for row in rows]
+    db.add_all(objects)
+    db.flush()
+    return [{column.key: getattr(obj, column.key) for column in model.__table__.columns} for obj in objects]
+
+def track_deadline(task: dict):
+    deadlines.scheduler.track(task["id"], task["owner"], task["title"], task["deadline"], task["status"])
+
+def task_data(task: models.Task) -> dict:
+    """The task's columns as a dict, read from the object without touching the database."""
+    return {name: getattr(task, name) for name in TASK_COLUMNS}
+
+def task_event(type: str, task: models.Task) -> dict:
+    return changes.event(type, task.owner, task.id, task_data(task))
+
+def minimal_return(prefer: Optional[str]) -> bool:
+    """Whether a Prefer header asks for return=minimal (RFC 7240)."""
+    return prefer is not None and any(p.split(";")[0].strip().lower() == "return=minimal" for p in prefer.split(","))
+
+def write_ack(task_id: int, status: str) -> JSONResponse:
+    return JSONResponse({"id": task_id, "status": status}, headers={"Preference-Applied": "return=minimal"})
+
+def child_events(tasks: dict, activity_entries: list, comments: list) -> list:
+    """comment.created / activity.created events for new comments and activity entries."""
+    return [
+        changes.event("comment.created", tasks[c["task_id"]].owner, c["task_id"], c) for c in comments
+    ] + [
+        changes.event("activity.created", tasks[a["task_id"]].owner, a["task_id"], a) for a in activity_entries
+    ]
+
+@router.put("/tasks/{task_id}", response_model=schemas.TaskOut)
+@router.put("/tasks/{task_id}", response_model=schemas.TaskOut)
+def update_task(task_id: int, update: schemas.TaskUpdate, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role), prefer: Optional[str] = Header(default=None)):
+    """
+    Apply a TaskUpdate. The task is loaded with its comments and activity, the new rows come
+    back from their INSERT (see insert_returning) and the response is assembled from those, so
+    nothing is read after commit. With `Prefer: return=minimal` only {"id", "status"} is
+    returned and the children are not loaded. Either way the new comments and activity are
+    written in the update's transaction, so reads in the other mode see them right away.
+    """
+    username, role = user_and_role
+    minimal = minimal_return(prefer)
+    sections = frozenset() if minimal else set(TASK_SECTIONS)
+    db_task = repository.get_task(db, task_id, username, role, sections, for_update=True)
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    before = rollups.snapshot(db_task)
+    activity_entries, comments = apply_task_update(db_task, update, username)
+    comments = write_comments(db, comments, returning=not minimal)
+    if minimal:
+        if activity_entries:
+            db.execute(insert(models.TaskActivity), activity_entries)
+    else:
+        activity_entries = insert_returning(db, models.TaskActivity, activity_entries)
+    rollups.task_changed(db, before, rollups.snapshot(db_task))
+    versions.bump(db, [db_task.owner] + [c["user"] for c in comments])
+    data = task_data(db_task)
+    events = [changes.event("task.updated", data["owner"], task_id, data)] + child_events({task_id: db_task}, activity_entries, comments)
+    if not minimal:
+        body = schemas.TaskOut.model_validate(db_task, from_attributes=True)
+        body.comments += [schemas.TaskCommentOut.model_validate(c) for c in comments]
+        body.activity_log += [schemas.TaskActivityOut.model_validate(a) for a in activity_entries]
     db.commit()
-    db.refresh(db_task)
-    return db_task
+    changes.publish(events)
+    track_deadline(data)
+    if minimal:
+        return write_ack(task_id, "updated")
+    return body
 
 
-@app.delete("/tasks/{task_id}")
-@app.delete("/tasks/{task_id}")
+@router.delete("/tasks/{task_id}")
+@router.delete("/tasks/{task_id}")
 def delete_task(task_id: int, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role)):
     username, role = user_and_role
-    if role == "Admin":
-        db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    else:
-        db_task = db.query(models.Task).filter(models.Task.id == task_id, models.Task.owner == username).first()
+    db_task = repository.visible_tasks(db, [task_id], username, role, repository.DELETE_COLUMNS, for_update=True).get(task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
-    db.delete(db_task)
+    commenters = rollups.comments_removed(db, [task_id])
+    if not repository.delete_tasks(db, [task_id]):
+        raise HTTPException(status_code=404, detail="Task not found")
+    rollups.task_changed(db, rollups.snapshot(db_task), None)
+    versions.bump(db, [db_task.owner] + commenters)
     db.commit()
+    changes.publish([changes.event("task.deleted", db_task.owner, task_id, {"id": task_id})])
+    deadlines.scheduler.untrack(task_id)
     return {"detail": "Task deleted"}
 
     # Endpoint to list all created users
-@app.get("/users")
+@router.get("/users")
 def list_users():
     db = user_database.SessionLocal()
     print("Listing users",db)
@@ -232,127 +767,423 @@ def list_users():
     finally:
         db.close()
 
-@app.get("/tasks/{task_id}/comments", response_model=list[schemas.TaskCommentOut])
-def get_task_comments(task_id: int, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role)):
+def next_cursor(response: Response, items: list, limit: Optional[int]):
+    """Send the id of a full page's last item as X-Next-Cursor."""
+    if limit is not None and len(items) == limit:
+        last = items[-1]
+        response.headers["X-Next-Cursor"] = str(last["id"] if isinstance(last, dict) else last.id)
+
+@router.get("/tasks/{task_id}/comments", response_model=list[schemas.TaskCommentOut])
+def get_task_comments(
+    task_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    user_and_role: tuple = Depends(get_current_user_and_role),
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=TASKS_PAGE_MAX),
+):
+    """
+    A task's comments, oldest first. With `limit` a page is returned and the cursor for the
+    next one, if any, is sent in the X-Next-Cursor header.
+    """
     username, role = user_and_role
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task:
+    found = repository.task_children(db, "comments", task_id, username, role, cursor, limit)
+    if found is None:
         raise HTTPException(status_code=404, detail="Task not found")
+    owner, comments = found
     # Only allow owner or admin to view comments
-    if role != "Admin" and task.owner != username:
+    if role != "Admin" and owner != username:
         raise HTTPException(status_code=403, detail="Not authorized to view comments")
-    return task.comments
+    next_cursor(response, comments, limit)
+    return comments
 
-@app.get("/tasks/{task_id}/activity", response_model=list[schemas.TaskActivityOut])
-def get_task_activity(task_id: int, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role)):
+@router.get("/tasks/{task_id}/activity", response_model=list[schemas.TaskActivityOut])
+def get_task_activity(
+    task_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    user_and_role: tuple = Depends(get_current_user_and_role),
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=TASKS_PAGE_MAX),
+    archived: bool = False,
+):
+    """
+    A task's activity log, oldest first. With `limit` a page is returned and the cursor for
+    the next one, if any, is sent in the X-Next-Cursor header. Entries older than
+    ACTIVITY_RETAIN_DAYS live in the archive and are only included with archived=true.
+    """
     username, role = user_and_role
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task:
+    if archived:
+        # The entries come from activity_log.history below, so only the owner is needed here
+        owner, entries = repository.task_owner(db, task_id), None
+    else:
+        owner, entries = repository.task_children(db, "activity", task_id, username, role, cursor, limit) or (None, None)
+    if owner is None:
         raise HTTPException(status_code=404, detail="Task not found")
     # Only allow owner or admin to view activity log
-    if role != "Admin" and task.owner != username:
+    if role != "Admin" and owner != username:
         raise HTTPException(status_code=403, detail="Not authorized to view activity log")
-    return task.activity_log
+    if archived:
+        entries = activity_log.history(db, task_id, cursor, limit, archived=True)
+    next_cursor(response, entries, limit)
+    return entries
 
 
-# --- DASHBOARD ENDPOINTS ---
-@app.get("/dashboard/status")
-def dashboard_status(db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role), user: str = None):
+@router.post("/tasks/batch", response_model=dict[int, schemas.TaskBatchItem], response_model_exclude_none=True)
+def get_tasks_batch(batch: schemas.TaskBatchRequest, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role)):
+    """
+    Comments and/or activity for many tasks at once, keyed by task id.
+    Visibility is resolved with one IN lookup; ids the caller cannot see are left out.
+    """
     username, role = user_and_role
-    q = db.query(models.Task.status, func.count(models.Task.id)).group_by(models.Task.status)
-    if role == "Admin" and user:
-        q = q.filter(models.Task.owner == user)
-    elif role != "Admin":
-        q = q.filter(models.Task.owner == username)
-    data = q.all()
+    sections = parse_sections(",".join(batch.include))
+    visible = list(repository.visible_tasks(db, batch.ids, username, role, ("id",)))
+    result = {task_id: {} for task_id in visible}
+    if not visible:
+        return result
+    if "comments" in sections:
+        for task_id in visible:
+            result[task_id]["comments"] = []
+        rows = db.query(models.TaskComment).filter(models.TaskComment.task_id.in_(visible)).order_by(models.TaskComment.id)
+        for comment in rows:
+            result[comment.task_id]["comments"].append(comment)
+    if "activity" in sections:
+        for task_id in visible:
+            result[task_id]["activity"] = []
+        rows = db.query(models.TaskActivity).filter(models.TaskActivity.task_id.in_(visible)).order_by(models.TaskActivity.id)
+        for entry in rows:
+            result[entry.task_id]["activity"].append(entry)
+    return result
+
+
+# --- DASHBOARD ENDPOINTS ---
+# Each widget is computed for a scope (one owner, or versions.ALL) and served through the
+# dashboard cache under its ETag, so repeat views are answered without recomputing.
+def cached_dashboard(db: Session, request: Request, response: Response, scope: Optional[str], compute, *parts):
+    """ETag check, then the widget from the dashboard cache keyed by the same tag."""
+    tag = check_etag(db, request, scope, *parts)
+    response.headers["ETag"] = tag
+    return dashboard_cache.cache.get_or_compute((scope, tag), compute)
+
+def status_widget(db: Session, owner: Optional[str]):
+    Rollup = models.OwnerStatusCount
+    q = db.query(Rollup.status, func.sum(Rollup.count)).filter(Rollup.count > 0)
+    if owner is not None:
+        q = q.filter(Rollup.owner == owner)
+    data = q.group_by(Rollup.status).order_by(Rollup.status).all()
     return [{"status": s, "value": c} for s, c in data]
 
-@app.get("/dashboard/productivity")
-def dashboard_productivity(db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role), user: str = None):
-    username, role = user_and_role
-    # Get tasks completed per day for last 14 days
-    base_query = db.query(
-        func.date(models.Task.completed_at).label("date"),
-        func.count(models.Task.id).label("completed")
-    ).filter(
-        models.Task.status == "Done",
-        models.Task.completed_at != None,
-        models.Task.completed_at >= datetime.utcnow() - timedelta(days=14)
+
+def progress_widget(db: Session, owner: Optional[str], edges: Optional[list] = None):
+    """
+    Task counts per progress range. The default ranges are served from the rollups;
+    custom edges are bucketed with a CASE aggregate in SQL.
+    """
+    if edges:
+        labels = [f"{lo}-{hi}%" for lo, hi in rollups.bucket_ranges(edges)]
+        bucket = rollups.bucket_expr(models.Task.progress, edges)
+        q = db.query(bucket, func.count(models.Task.id)).filter(models.Task.progress.between(edges[0], edges[-1]))
+        owner_col = models.Task.owner
+    else:
+        labels = rollups.PROGRESS_LABELS
+        Rollup = models.OwnerProgressCount
+        q = db.query(Rollup.bucket, func.sum(Rollup.count))
+        bucket = Rollup.bucket
+        owner_col = Rollup.owner
+    if owner is not None:
+        q = q.filter(owner_col == owner)
+    counts = dict(q.group_by(bucket).all())
+    return [{"range": label, "count": counts.get(i, 0)} for i, label in enumerate(labels)]
+
+def open_statuses(db: Session, owner: Optional[str]):
+    """Statuses other than Done that currently have tasks, from the status rollup."""
+    Rollup = models.OwnerStatusCount
+    q = db.query(Rollup.status).filter(Rollup.status != "Done", Rollup.count > 0)
+    if owner is not None:
+        q = q.filter(Rollup.owner == owner)
+    return sorted({status for (status,) in q})
+
+def upcoming_widget(db: Session, owner: Optional[str], start: Optional[datetime], end: datetime, after: Optional[tuple] = None, limit: Optional[int] = None):
+    """
+    Open tasks with a deadline in [start, end) ordered by (deadline, id); start None means
+    everything before end. `status IN (...)` over the open statuses (instead of != "Done")
+    lets the (owner, status, deadline) index serve the range. `after` is the keyset
+    (deadline, id) of the previous page's last item.
+    """
+    Task = models.Task
+    statuses = open_statuses(db, owner)
+    if not statuses:
+        return []
+    q = db.query(Task.id, Task.title, Task.deadline, Task.status, Task.owner).filter(
+        Task.status.in_(statuses), Task.deadline < end
     )
-    if role == "Admin" and user:
-        base_query = base_query.filter(models.Task.owner == user)
-    elif role != "Admin":
-        base_query = base_query.filter(models.Task.owner == username)
-    base_query = base_query.group_by(func.date(models.Task.completed_at)).order_by(func.date(models.Task.completed_at))
-    data = base_query.all()
-    # Fill missing days
-    days = [(datetime.utcnow() - timedelta(days=i)).date() for i in range(13, -1, -1)]
-    result = []
-    data_dict = {str(d[0]): d[1] for d in data if d[0]}
-    for d in days:
-        result.append({"date": d.strftime("%Y-%m-%d"), "completed": data_dict.get(str(d), 0)})
-    return result
+    if start is not None:
+        q = q.filter(Task.deadline >= start)
+    else:
+        q = q.filter(Task.deadline != None)
+    if owner is not None:
+        q = q.filter(Task.owner == owner)
+    if after is not None:
+        q = q.filter(or_(Task.deadline > after[0], and_(Task.deadline == after[0], Task.id > after[1])))
+    q = q.order_by(Task.deadline, Task.id)
+    if limit is not None:
+        q = q.limit(limit)
+    return [
+        {"id": t.id, "title": t.title, "deadline": t.deadline.isoformat(), "status": t.status, "owner": t.owner}
+        for t in q
+    ]
 
-@app.get("/dashboard/progress")
-def dashboard_progress(db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role), user: str = None):
+def rollup_widgets(db: Session, owner: Optional[str], sections: set, days: list):
+    """
+    The status, progress and productivity widgets from one UNION ALL over their rollup
+    tables, each branch filtered to the owner. Returns {section: widget} for `sections`.
+    """
+    def branch(section, model, key, *where):
+        q = select(literal(section, String), cast(key, String), func.sum(model.count)).where(*where)
+        if owner is not None:
+            q = q.where(model.owner == owner)
+        return q.group_by(key)
+
+    branches = []
+    if "status" in sections:
+        branches.append(branch("status", models.OwnerStatusCount, models.OwnerStatusCount.status, models.OwnerStatusCount.count > 0))
+    if "progress" in sections:
+        branches.append(branch("progress", models.OwnerProgressCount, models.OwnerProgressCount.bucket))
+    if "productivity" in sections:
+        branches.append(branch("productivity", models.DailyCompletionCount, models.DailyCompletionCount.day, models.DailyCompletionCount.day >= days[0]))
+    counts = {section: {} for section in sections}
+    if branches:
+        for section, key, count in db.execute(union_all(*branches)):
+            counts[section][key] = count
+    widgets = {}
+    if "status" in sections:
+        widgets["status"] = [{"status": s, "value": c} for s, c in sorted(counts["status"].items())]
+    if "progress" in sections:
+        widgets["progress"] = [
+            {"range": label, "count": counts["progress"].get(str(i), 0)} for i, label in enumerate(rollups.PROGRESS_LABELS)
+        ]
+    if "productivity" in sections:
+        widgets["productivity"] = [
+            {"date": d.strftime("%Y-%m-%d"), "completed": counts["productivity"].get(d.isoformat(), 0)} for d in days
+        ]
+    return widgets
+
+@router.get("/dashboard/status")
+def dashboard_status(request: Request, response: Response, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role), user: str = None):
     username, role = user_and_role
-    # Ranges: 0-25, 26-50, 51-75, 76-100
-    ranges = [(0,25), (26,50), (51,75), (76,100)]
-    labels = ["0-25%", "26-50%", "51-75%", "76-100%"]
-    q = db.query(models.Task.progress)
-    if role == "Admin" and user:
-        q = q.filter(models.Task.owner == user)
-    elif role != "Admin":
-        q = q.filter(models.Task.owner == username)
-    progress_list = [t[0] for t in q.all() if t[0] is not None]
-    buckets = [0,0,0,0]
-    for p in progress_list:
-        for i, (lo, hi) in enumerate(ranges):
-            if lo <= p <= hi:
-                buckets[i] += 1
-                break
-    return [{"range": labels[i], "count": buckets[i]} for i in range(4)]
+    scope = read_scope(username, role, user)
+    return cached_dashboard(db, request, response, scope, lambda: status_widget(db, scope))
 
-@app.get("/dashboard/upcoming")
-def dashboard_upcoming(db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role), user: str = None):
+@router.get("/dashboard/productivity")
+def dashboard_productivity(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    user_and_role: tuple = Depends(get_current_user_and_role),
+    user: str = None,
+    date_from: Optional[datetime] = Query(default=None, alias="from"),
+    date_to: Optional[datetime] = Query(default=None, alias="to"),
+    granularity: str = "day",
+    by_owner: bool = False,
+):
+    """
+    Tasks completed per hour, day, week or month between `from` and `to` (inclusive; default
+    the last 14 days up to now). With by_owner each period also splits the count per owner.
+    """
     username, role = user_and_role
+    scope = read_scope(username, role, user)
     now = datetime.utcnow()
-    week = now + timedelta(days=7)
-    q = db.query(models.Task).filter(models.Task.status != "Done")
-    if hasattr(models.Task, "deadline"):
-        q = q.filter(models.Task.deadline != None, models.Task.deadline >= now, models.Task.deadline <= week)
-    if role == "Admin" and user:
-        q = q.filter(models.Task.owner == user)
-    elif role != "Admin":
-        q = q.filter(models.Task.owner == username)
-    tasks = q.order_by(models.Task.deadline).all() if hasattr(models.Task, "deadline") else []
-    # fallback: if no deadline field, return empty
-    return [
-        {"id": t.id, "title": t.title, "deadline": t.deadline, "status": t.status}
-        for t in tasks
-    ]
+    # Stored completion times are naive UTC; aware bounds ("...Z", "+02:00") are converted
+    date_from, date_to = schemas.naive_utc(date_from), schemas.naive_utc(date_to)
+    end = date_to or now
+    start = date_from or (end - timedelta(days=13))
+    if start > end:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+
+    def compute():
+        try:
+            return analytics.productivity(db, start, end, granularity, scope, by_owner)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Without `to` the window moves with the clock, so the current hour is part of the tag
+    return cached_dashboard(db, request, response, scope, compute, now.strftime("%Y-%m-%dT%H") if date_to is None else "")
+
+def parse_bucket_edges(buckets: str):
+    try:
+        edges = [int(e) for e in buckets.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="buckets must be a comma-separated list of integers")
+    if len(edges) < 2 or edges[0] < 0 or edges[-1] > 100 or any(a >= b for a, b in zip(edges, edges[1:])):
+        raise HTTPException(status_code=400, detail="buckets must be at least two increasing values between 0 and 100")
+    return edges
+
+@router.get("/dashboard/progress")
+def dashboard_progress(request: Request, response: Response, db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role), user: str = None, buckets: Optional[str] = None):
+    """Task counts per progress range; custom edges may be given as e.g. ?buckets=0,10,50,90,100."""
+    username, role = user_and_role
+    scope = read_scope(username, role, user)
+    edges = parse_bucket_edges(buckets) if buckets else None
+    return cached_dashboard(db, request, response, scope, lambda: progress_widget(db, scope, edges))
+
+def parse_upcoming_cursor(cursor: str):
+    try:
+        deadline, task_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(deadline), int(task_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/dashboard/upcoming")
+def dashboard_upcoming(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    user_and_role: tuple = Depends(get_current_user_and_role),
+    user: str = None,
+    days: int = Query(default=7, ge=1, le=366),
+    overdue: bool = False,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=TASKS_PAGE_MAX),
+):
+    """
+    Open tasks due in the next `days` days, soonest first, or with overdue=true those whose
+    deadline has passed. With `limit` a page is returned and the cursor for the next one,
+    if any, is sent in the X-Next-Cursor header.
+    """
+    username, role = user_and_role
+    scope = read_scope(username, role, user)
+    after = parse_upcoming_cursor(cursor) if cursor else None
+    # The window moves with time; tags (and cache entries) are reused within the minute
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    start, end = (None, now) if overdue else (now, now + timedelta(days=days))
+    items = cached_dashboard(
+        db, request, response, scope,
+        lambda: upcoming_widget(db, scope, start, end, after, limit),
+        now.isoformat(), days, overdue, cursor, limit,
+    )
+    if limit is not None and len(items) == limit:
+        response.headers["X-Next-Cursor"] = f"{items[-1]['deadline']}_{items[-1]['id']}"
+    return items
+
+@router.get("/dashboard/cache")
+def dashboard_cache_stats(user_and_role: tuple = Depends(get_current_user_and_role)):
+    """Hit/miss counters of the dashboard cache for this process."""
+    _, role = user_and_role
+    if role != "Admin":
+        raise HTTPException(status_code=403, detail="Only admin can view cache stats")
+    return dashboard_cache.cache.stats()
+
+USER_SUMMARY_SORT_KEYS = ("username", "assigned", "completed", "comments")
+
+def user_list_version(user_db: Session):
+    """Users are registered in the user service, so their count and newest id go into the tag."""
+    return user_db.query(func.count(user_models.User.id), func.max(user_models.User.id)).one()
+
+def user_summary_rows(db: Session, user_db: Session, sort: str = "username", order: str = "asc"):
+    totals = rollups.user_totals(db)
+    # Get all users
+    names = [name for (name,) in user_db.query(user_models.User.username).order_by(user_models.User.id)]
+    empty = {"assigned": 0, "completed": 0, "comments": 0}
+    result = [{"username": name, **totals.get(name, empty)} for name in names]
+    if sort != "username" or order == "desc":
+        # Ties keep the username order so pages are stable
+        result.sort(key=lambda row: row["username"])
+        result.sort(key=lambda row: row[sort], reverse=(order == "desc"))
+    return result
 
-@app.get("/dashboard/user_summary")
-def dashboard_user_summary(db: Session = Depends(get_db), user_and_role: tuple = Depends(get_current_user_and_role)):
+@router.get("/dashboard/user_summary")
+def dashboard_user_summary(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    user_and_role: tuple = Depends(get_current_user_and_role),
+    sort: str = "username",
+    order: str = Query(default="asc", pattern="^(asc|desc)$"),
+    offset: int = Query(default=0, ge=0),
+    limit: Optional[int] = Query(default=None, ge=1, le=TASKS_PAGE_MAX),
+):
+    """
+    Per-user task and comment totals, merged in memory with the user list.
+    Optionally sorted by any column and paginated with offset/limit; the number of users
+    before pagination is returned in the X-Total-Count header.
+    """
     # Only admin can see all users
     username, role = user_and_role
     if role != "Admin":
         raise HTTPException(status_code=403, detail="Only admin can view user summary")
-    # Get all users
+    if sort not in USER_SUMMARY_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(USER_SUMMARY_SORT_KEYS)}")
     user_db = user_database.SessionLocal()
     try:
-        users = user_db.query(user_models.User).all()
-        result = []
-        for user in users:
-            assigned = db.query(models.Task).filter(models.Task.owner == user.username).count()
-            completed = db.query(models.Task).filter(models.Task.owner == user.username, models.Task.status == "Done").count()
-            comments = db.query(models.TaskComment).filter(models.TaskComment.user == user.username).count()
-            result.append({
-                "username": user.username,
-                "assigned": assigned,
-                "completed": completed,
-                "comments": comments
-            })
-        return result
+        def compute():
+            result = user_summary_rows(db, user_db, sort, order)
+            end = offset + limit if limit is not None else None
+            return {"total": len(result), "page": result[offset:end]}
+
+        summary = cached_dashboard(db, request, response, versions.ALL, compute, *user_list_version(user_db))
     finally:
         user_db.close()
+    response.headers["X-Total-Count"] = str(summary["total"])
+    return summary["page"]
+
+DASHBOARD_SECTIONS = ("status", "productivity", "progress", "upcoming", "user_summary")
+
+@router.get("/dashboard")
+def dashboard(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    user_and_role: tuple = Depends(get_current_user_and_role),
+    user: str = None,
+    sections: Optional[str] = None,
+    buckets: Optional[str] = None,
+):
+    """
+    Dashboard widgets in one response, keyed by section name, with the same content as the
+    /dashboard/<section> endpoints. `sections` picks a subset (default: all; user_summary is
+    Admin only). Status, progress and productivity come from a single query over the rollups.
+    """
+    username, role = user_and_role
+    if sections:
+        requested = {s.strip() for s in sections.split(",") if s.strip()}
+        unknown = requested - set(DASHBOARD_SECTIONS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown dashboard section(s): {', '.join(sorted(unknown))}")
+    else:
+        requested = set(DASHBOARD_SECTIONS) if role == "Admin" else set(DASHBOARD_SECTIONS) - {"user_summary"}
+    if "user_summary" in requested and role != "Admin":
+        raise HTTPException(status_code=403, detail="Only admin can view user summary")
+    edges = parse_bucket_edges(buckets) if buckets else None
+    scope = read_scope(username, role, user)
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    days = [(now - timedelta(days=i)).date() for i in range(13, -1, -1)]
+    user_db = user_database.SessionLocal() if "user_summary" in requested else None
+    try:
+        def compute():
+            rollup_sections = requested & {"status", "progress", "productivity"}
+            if edges:
+                rollup_sections.discard("progress")
+            widgets = rollup_widgets(db, scope, rollup_sections, days)
+            if edges and "progress" in requested:
+                widgets["progress"] = progress_widget(db, scope, edges)
+            if "upcoming" in requested:
+                widgets["upcoming"] = upcoming_widget(db, scope, now, now + timedelta(days=7))
+            if user_db is not None:
+                widgets["user_summary"] = user_summary_rows(db, user_db)
+            return {section: widgets[section] for section in DASHBOARD_SECTIONS if section in requested}
+
+        if user_db is not None:
+            # The user summary covers everyone, so it is only current while no owner has changed
+            return cached_dashboard(db, request, response, versions.ALL, compute, scope, now.isoformat(), *user_list_version(user_db))
+        return cached_dashboard(db, request, response, scope, compute, now.isoformat())
+    finally:
+        if user_db is not None:
+            user_db.close()
+
+
+# Endpoints that also open sessions on the user database stay on the threadpool in async mode
+SYNC_ONLY = {"delete_user", "dashboard_user_summary", "dashboard"}
+if database.DB_MODE == "async":
+    app.include_router(asyncify_router(router, get_db, get_async_db, sync_only=SYNC_ONLY))
+else:
+    app.include_router(router)
@@ -0,0 +1,75 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from task_service import models, database, search
+
+def add_task_deadline(conn):
+    if "deadline" not in {column["name"] for column in inspect(conn).get_columns("tasks")}:
+        column_type = models.Task.__table__.c.deadline.type.compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE tasks ADD COLUMN deadline {column_type}"))
+
+
+# create_all only creates missing tables, so schema changes to existing tables are
+# applied here. Each migration runs once, in order, and is recorded in schema_migrations.
+# Steps must be safe on a database freshly created from the current models.
+MIGRATIONS = [
+    (1, "Composite and foreign-key indexes for dashboard, listing and child lookups", [
+        "CREATE INDEX IF NOT EXISTS ix_tasks_owner_status ON tasks (owner, status)",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_status_completed_at ON tasks (status, completed_at)",
+        "CREATE INDEX IF NOT EXISTS ix_task_comments_task_id ON task_comments (task_id)",
+        'CREATE INDEX IF NOT EXISTS ix_task_comments_user ON task_comments ("user")',
+        "CREATE INDEX IF NOT EXISTS ix_task_activities_task_id ON task_activities (task_id)",
+    ]),
+    (2, "Remove comments and activity orphaned by earlier user deletions", [
+        "DELETE FROM task_comments WHERE task_id NOT IN (SELECT id FROM tasks)",
+        "DELETE FROM task_activities WHERE task_id NOT IN (SELECT id FROM tasks)",
+        "DELETE FROM rollup_user_comments",
+        'INSERT INTO rollup_user_comments ("user", count) SELECT "user", COUNT(id) FROM task_comments GROUP BY "user"',
+    ]),
+    (3, "Task deadlines with indexes for upcoming-deadline queries", [
+        add_task_deadline,
+        "CREATE INDEX IF NOT EXISTS ix_tasks_owner_status_deadline ON tasks (owner, status, deadline)",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_status_deadline ON tasks (status, deadline)",
+    ]),
+    (4, "Full-text search index over task titles, descriptions and comments", [
+        search.install,
+    ]),
+    (5, "Index activity timestamps for archival", [
+        "CREATE INDEX IF NOT EXISTS ix_task_activities_timestamp ON task_activities (timestamp)",
+    ]),
+    (6, "Drop the shared version row; the all-owners version is derived from the owner rows", [
+        "DELETE FROM owner_versions WHERE owner = '*'",
+    ]),
+]
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def upgrade(engine: Engine = database.engine):
+    """Apply pending migrations, each in its own transaction. Returns the versions applied."""
+    models.Base.metadata.create_all(bind=engine, tables=[models.SchemaMigration.__table__])
+    applied = []
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+    for version, description, steps in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(text(step))
+            conn.execute(
+                models.SchemaMigration.__table__.insert().values(version=version, description=description)
+            )
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    # Migration command: python -m task_service.migrations
+    models.Base.metadata.create_all(bind=database.engine)
+    versions = upgrade()
+    print(f"Applied migrations: {versions}" if versions else "Database schema is up to date")
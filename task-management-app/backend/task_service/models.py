@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Text, Index, LargeBinary
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 # from .database import Base
@@ -15,16 +15,29 @@ class Task(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     completed_at = Column(DateTime(timezone=True), nullable=True)
     progress = Column(Integer, default=0, nullable=False)
+    deadline = Column(DateTime(timezone=True), nullable=True)
 
     comments = relationship("TaskComment", back_populates="task", cascade="all, delete-orphan")
     activity_log = relationship("TaskActivity", back_populates="task", cascade="all, delete-orphan")
 
+    # Server defaults (created_at) come back with the INSERT (RETURNING where supported), so
+    # a new task can be serialized without a refresh
+    __mapper_args__ = {"eager_defaults": True}
+
+    # Existing databases get these through task_service.migrations
+    __table_args__ = (
+        Index("ix_tasks_owner_status", "owner", "status"),
+        Index("ix_tasks_status_completed_at", "status", "completed_at"),
+        Index("ix_tasks_owner_status_deadline", "owner", "status", "deadline"),
+        Index("ix_tasks_status_deadline", "status", "deadline"),
+    )
+
 
 class TaskComment(Base):
     __tablename__ = "task_comments"
     id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
-    user = Column(String, nullable=False)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True)
+    user = Column(String, nullable=False, index=True)
     comment = Column(Text, nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     task = relationship("Task", back_populates="comments")
@@ -33,9 +46,90 @@ class TaskComment(Base):
 class TaskActivity(Base):
     __tablename__ = "task_activities"
     id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True)
     user = Column(String, nullable=False)
     action = Column(String, nullable=False)  # e.g., status_change, comment
     detail = Column(Text, nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     task = relationship("Task", back_populates="activity_log")
+
+    # Archival selects entries older than a cutoff; existing databases get it through migrations
+    __table_args__ = (Index("ix_task_activities_timestamp", "timestamp"),)
+
+
+# Activity entries moved out of task_activities by task_service.activity_log.archive: one row
+# per task and month (or part of one), holding the entries as zlib-compressed JSON
+class TaskActivityArchive(Base):
+    __tablename__ = "task_activity_archive"
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    period = Column(String, nullable=False)  # "YYYY-MM" of the entries' timestamps
+    first_id = Column(Integer, nullable=False)
+    last_id = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (Index("ix_task_activity_archive_task_first_id", "task_id", "first_id"),)
+
+
+# Progress of a user deletion; see task_service.user_deletion
+class UserDeletion(Base):
+    __tablename__ = "user_deletions"
+    username = Column(String, primary_key=True)
+    status = Column(String, nullable=False, default="running")  # running, done
+    tasks_total = Column(Integer, nullable=False, default=0)
+    tasks_deleted = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+# Change feed history for the "database" backend; see task_service.changes
+class ChangeEvent(Base):
+    __tablename__ = "change_events"
+    id = Column(Integer, primary_key=True)
+    type = Column(String, nullable=False)  # task.created, task.updated, task.deleted, comment.created, activity.created, user.deleted
+    owner = Column(String, nullable=False)
+    task_id = Column(Integer, nullable=True)
+    data = Column(Text, nullable=False)  # JSON payload
+    ts = Column(DateTime(timezone=True), nullable=False)
+
+# --- DASHBOARD ROLLUPS ---
+# Counters kept in step with task/comment writes (see task_service.rollups).
+class OwnerStatusCount(Base):
+    __tablename__ = "rollup_owner_status"
+    owner = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class OwnerProgressCount(Base):
+    __tablename__ = "rollup_owner_progress"
+    owner = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)  # index into rollups.PROGRESS_BUCKETS
+    count = Column(Integer, nullable=False, default=0)
+
+
+class DailyCompletionCount(Base):
+    __tablename__ = "rollup_daily_completions"
+    owner = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class UserCommentCount(Base):
+    __tablename__ = "rollup_user_comments"
+    user = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+# Bumped with every task/comment write; see task_service.versions
+class OwnerVersion(Base):
+    __tablename__ = "owner_versions"
+    owner = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
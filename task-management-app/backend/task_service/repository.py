@@ -0,0 +1,155 @@
+"""
+Task lookups scoped to what a (username, role) may see. Admins see every task, everyone
+else only their own; the scope is part of each statement rather than checked afterwards.
+Statements are built once per shape and reused with bound parameters, so SQLAlchemy's
+compiled-statement cache is hit on every call.
+"""
+import functools
+from typing import Optional
+from sqlalchemy import and_, bindparam, delete, select, text
+from sqlalchemy.orm import Session, joinedload, load_only, noload, selectinload
+from task_service import models, activity_log
+
+Task = models.Task
+# Include section -> relationship on Task and the child model behind it
+RELATIONSHIPS = {"comments": Task.comments, "activity": Task.activity_log}
+CHILD_MODELS = {"comments": models.TaskComment, "activity": models.TaskActivity}
+# What deletes need of a task: its id and the fields rollups.snapshot reads
+DELETE_COLUMNS = ("id", "owner", "status", "progress", "completed_at")
+
+
+def owner_scope(username: str, role: str) -> Optional[str]:
+    """The owner a user's lookups are limited to, or None for Admin."""
+    return None if role == "Admin" else username
+
+
+def list_filters(username: str, role: str, user: Optional[str] = None) -> list:
+    """Filters for listing tasks: the caller's own, or for Admin everyone's or the selected user's."""
+    owner = owner_scope(username, role) or user
+    return [Task.owner == owner] if owner else []
+
+
+def lock_for_write(db: Session):
+    """
+    Take the write lock for the rest of the caller's transaction, before it reads the rows it
+    is about to change, so the rollup snapshots it takes cannot be changed by another writer
+    before it commits. SQLite has no row locks: the transaction is begun with BEGIN IMMEDIATE
+    (call it first in the transaction). Elsewhere the rows are read FOR UPDATE instead.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(text("BEGIN IMMEDIATE"))
+
+
+@functools.lru_cache(maxsize=64)
+def task_statement(sections: Optional[frozenset], columns: Optional[tuple], scoped: bool, for_update: bool = False):
+    """
+    SELECT for one task by id (and owner when scoped). With `sections`, the first child
+    collection is joined into the same statement and any other is loaded with one IN query
+    (joining both would multiply comments by activity rows); unrequested ones are skipped.
+    Without `sections` the relationships load lazily as usual.
+    """
+    stmt = select(Task).where(Task.id == bindparam("task_id"))
+    if scoped:
+        stmt = stmt.where(Task.owner == bindparam("owner"))
+    if for_update:
+        stmt = stmt.with_for_update(of=Task)
+    if columns is not None:
+        stmt = stmt.options(load_only(*[getattr(Task, name) for name in columns]))
+    if sections is not None:
+        loaders = [joinedload, selectinload]
+        for section, rel in RELATIONSHIPS.items():
+            stmt = stmt.options(loaders.pop(0)(rel) if section in sections else noload(rel))
+    return stmt
+
+
+def get_task(db: Session, task_id: int, username: str, role: str, sections=None, columns=None, for_update: bool = False) -> Optional[models.Task]:
+    """The task if it exists and is visible to the caller, else None. `for_update`: see lock_for_write."""
+    if for_update:
+        lock_for_write(db)
+    owner = owner_scope(username, role)
+    stmt = task_statement(
+        frozenset(sections) if sections is not None else None,
+        tuple(columns) if columns is not None else None,
+        owner is not None,
+        for_update,
+    )
+    params = {"task_id": task_id} if owner is None else {"task_id": task_id, "owner": owner}
+    return db.execute(stmt, params).unique().scalars().first()
+
+
+def task_owner(db: Session, task_id: int) -> Optional[str]:
+    """The task's owner, or None when it does not exist."""
+    return db.execute(select(Task.owner).where(Task.id == task_id)).scalar()
+
+
+@functools.lru_cache(maxsize=16)
+def children_statement(section: str, paged: bool, scoped: bool):
+    """
+    The task's owner with its children after an id, from one LEFT JOIN (one row with NULLs when
+    it has none). When scoped, children are only joined if the task belongs to :owner, so a
+    caller who may not see them gets the single owner row.
+    """
+    model = CHILD_MODELS[section]
+    on = [model.task_id == Task.id, model.id > bindparam("after")]
+    if scoped:
+        on.append(Task.owner == bindparam("owner"))
+    stmt = (
+        select(Task.owner, model)
+        .outerjoin(model, and_(*on))
+        .where(Task.id == bindparam("task_id"))
+        .order_by(model.id)
+    )
+    return stmt.limit(bindparam("limit")) if paged else stmt
+
+
+def task_children(db: Session, section: str, task_id: int, username: str, role: str, after: Optional[int] = None, limit: Optional[int] = None):
+    """
+    (owner, children ordered by id) for a task in one round trip, or None when the task does
+    not exist. Children are only returned when the caller may see them; the caller tells a
+    forbidden task from one without children by its owner.
+    """
+    owner = owner_scope(username, role)
+    params = {"task_id": task_id, "after": after if after is not None else 0}
+    if owner is not None:
+        params["owner"] = owner
+    if limit is not None:
+        params["limit"] = limit
+    rows = db.execute(children_statement(section, limit is not None, owner is not None), params).all()
+    if not rows:
+        return None
+    return rows[0][0], [child for _, child in rows if child is not None]
+
+
+def visible_tasks(db: Session, ids, username: str, role: str, columns=None, for_update: bool = False) -> dict:
+    """
+    {id: task} for the ids the caller can see, from one IN query; ORM objects, or rows of
+    `columns`. `for_update`: see lock_for_write.
+    """
+    stmt = select(*[getattr(Task, name) for name in columns]) if columns else select(Task)
+    stmt = stmt.where(Task.id.in_(set(ids)))
+    owner = owner_scope(username, role)
+    if owner is not None:
+        stmt = stmt.where(Task.owner == owner)
+    if for_update:
+        lock_for_write(db)
+        stmt = stmt.with_for_update(of=Task)
+    result = db.execute(stmt)
+    return {row.id: row for row in (result.all() if columns else result.scalars())}
+
+
+def delete_tasks(db: Session, ids: list) -> list:
+    """
+    Set-based delete of tasks with their comments, activity and archived activity, in the
+    caller's transaction. Returns the ids of the tasks actually removed; rollups are only
+    decremented for those.
+    """
+    db.execute(delete(models.TaskComment).where(models.TaskComment.task_id.in_(ids)))
+    db.execute(delete(models.TaskActivity).where(models.TaskActivity.task_id.in_(ids)))
+    activity_log.delete_archived(db, ids)
+    stmt = delete(Task).where(Task.id.in_(ids))
+    if db.get_bind().dialect.delete_returning:
+        return list(db.execute(stmt.returning(Task.id)).scalars())
+    # Without RETURNING: callers read the ids under lock_for_write, so no other transaction
+    # can have removed any of them since
+    db.execute(stmt)
+    return list(ids)
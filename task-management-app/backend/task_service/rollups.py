@@ -0,0 +1,181 @@
+from collections import Counter
+from sqlalchemy import func, case, insert, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from task_service import models, database
+
+def bucket_ranges(edges):
+    """Inclusive integer ranges for bucket edges, e.g. [0, 25, 50] -> [(0, 25), (26, 50)]."""
+    return [(edges[0] if i == 0 else lo + 1, hi) for i, (lo, hi) in enumerate(zip(edges, edges[1:]))]
+
+
+def bucket_expr(column, edges):
+    """SQL CASE mapping a progress column to its bucket index for the given edges."""
+    if len(edges) == 2:
+        # A single bucket has no inner edges, and a CASE needs at least one WHEN
+        return literal(0)
+    return case(*[(column <= hi, i) for i, hi in enumerate(edges[1:-1])], else_=len(edges) - 2)
+
+
+# Progress ranges shown on the dashboard: 0-25, 26-50, 51-75, 76-100
+PROGRESS_EDGES = [0, 25, 50, 75, 100]
+PROGRESS_BUCKETS = bucket_ranges(PROGRESS_EDGES)
+PROGRESS_LABELS = [f"{lo}-{hi}%" for lo, hi in PROGRESS_BUCKETS]
+
+ROLLUP_MODELS = [
+    models.OwnerStatusCount,
+    models.OwnerProgressCount,
+    models.DailyCompletionCount,
+    models.UserCommentCount,
+]
+
+
+def progress_bucket(progress):
+    for i, (lo, hi) in enumerate(PROGRESS_BUCKETS):
+        if lo <= progress <= hi:
+            return i
+    return None
+
+
+def snapshot(task: models.Task):
+    """The parts of a task the rollups depend on, taken before and after a write."""
+    day = None
+    if task.status == "Done" and task.completed_at is not None:
+        day = task.completed_at.date()
+    return {
+        "owner": task.owner,
+        "status": task.status,
+        "bucket": progress_bucket(task.progress if task.progress is not None else 0),
+        "day": day,
+    }
+
+
+def bump(db: Session, model, delta: int, **keys):
+    """Add delta to one counter row, creating it on first use (INSERT ... ON CONFLICT DO UPDATE)."""
+    if not delta:
+        return
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(model).values(count=delta, **keys)
+    stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_={"count": model.count + delta})
+    db.execute(stmt)
+
+
+# Counter table and the snapshot fields that key it
+DIMENSIONS = [
+    (models.OwnerStatusCount, ("owner", "status")),
+    (models.OwnerProgressCount, ("owner", "bucket")),
+    (models.DailyCompletionCount, ("owner", "day")),
+]
+
+
+def task_changed(db: Session, before, after):
+    """
+    Move a task between counters. Pass before=None for a new task and after=None for a
+    deleted one. Runs in the caller's session so it commits together with the task write.
+    """
+    tasks_changed(db, [(before, after)])
+
+
+def tasks_changed(db: Session, changes):
+    """Apply many (before, after) snapshot pairs, netting them to one upsert per counter row."""
+    deltas = Counter()
+    for before, after in changes:
+        for model, fields in DIMENSIONS:
+            old = _counter_key(before, fields)
+            new = _counter_key(after, fields)
+            if old == new:
+                continue
+            if old is not None:
+                deltas[(model, old)] -= 1
+            if new is not None:
+                deltas[(model, new)] += 1
+    for (model, keys), delta in deltas.items():
+        bump(db, model, delta, **dict(keys))
+
+
+def _counter_key(snap, fields):
+    if snap is None or any(snap[f] is None for f in fields):
+        return None
+    return tuple((f, snap[f]) for f in fields)
+
+
+def comments_added(db: Session, users):
+    for user, count in Counter(users).items():
+        bump(db, models.UserCommentCount, count, user=user)
+
+
+def comments_removed(db: Session, task_ids):
+    """
+    Decrement comment counters for every comment on the given tasks (call before deleting them).
+    Returns the comment authors affected.
+    """
+    rows = db.query(models.TaskComment.user, func.count(models.TaskComment.id)).filter(
+        models.TaskComment.task_id.in_(task_ids)
+    ).group_by(models.TaskComment.user).all()
+    for user, count in rows:
+        bump(db, models.UserCommentCount, -count, user=user)
+    return [user for user, _ in rows]
+
+
+def user_totals(db: Session):
+    """
+    Assigned/completed/comment totals per user from two grouped reads of the rollups:
+    one GROUP BY owner with a conditional sum for Done, one over the comment counters.
+    """
+    Rollup = models.OwnerStatusCount
+    totals = {}
+    rows = db.query(
+        Rollup.owner,
+        func.sum(Rollup.count),
+        func.sum(case((Rollup.status == "Done", Rollup.count), else_=0)),
+    ).group_by(Rollup.owner)
+    for owner, assigned, completed in rows:
+        totals[owner] = {"assigned": assigned or 0, "completed": completed or 0, "comments": 0}
+    for user, count in db.query(models.UserCommentCount.user, models.UserCommentCount.count):
+        totals.setdefault(user, {"assigned": 0, "completed": 0, "comments": 0})["comments"] = count
+    return totals
+
+
+def rebuild(db: Session):
+    """Recompute every rollup from the tasks and task_comments tables."""
+    for model in ROLLUP_MODELS:
+        db.query(model).delete(synchronize_session=False)
+    Task = models.Task
+    bucket = bucket_expr(Task.progress, PROGRESS_EDGES)
+    day = func.date(Task.completed_at)
+    db.execute(insert(models.OwnerStatusCount).from_select(
+        ["owner", "status", "count"],
+        select(Task.owner, Task.status, func.count(Task.id)).group_by(Task.owner, Task.status),
+    ))
+    db.execute(insert(models.OwnerProgressCount).from_select(
+        ["owner", "bucket", "count"],
+        select(Task.owner, bucket, func.count(Task.id)).group_by(Task.owner, bucket),
+    ))
+    db.execute(insert(models.DailyCompletionCount).from_select(
+        ["owner", "day", "count"],
+        select(Task.owner, day, func.count(Task.id))
+        .where(Task.status == "Done", Task.completed_at != None)
+        .group_by(Task.owner, day),
+    ))
+    db.execute(insert(models.UserCommentCount).from_select(
+        ["user", "count"],
+        select(models.TaskComment.user, func.count(models.TaskComment.id)).group_by(models.TaskComment.user),
+    ))
+    db.commit()
+
+
+def ensure_backfilled(db: Session):
+    """Backfill the rollups when they are empty but tasks already exist (e.g. first start after upgrade)."""
+    if db.query(models.OwnerStatusCount).first() is None and db.query(models.Task.id).first() is not None:
+        rebuild(db)
+
+
+if __name__ == "__main__":
+    # Backfill command: python -m task_service.rollups
+    models.Base.metadata.create_all(bind=database.engine)
+    session = database.SessionLocal()
+    try:
+        rebuild(session)
+        print("Dashboard rollups rebuilt")
+    finally:
+        session.close()
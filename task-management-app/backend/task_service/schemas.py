@@ -1,6 +1,13 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+
+def naive_utc(value: Optional[datetime]):
+    """Timestamps are stored as naive UTC; convert aware inputs (deadlines, report bounds)."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 class TaskCommentOut(BaseModel):
     id: int
@@ -24,14 +31,20 @@ class TaskCreate(BaseModel):
     description: Optional[str] = None
     status: str = Field(default="To Do")
     owner: Optional[str] = None  # Only admin can set this
+    deadline: Optional[datetime] = None
     # progress should not be set on creation; default 0
 
+    _deadline_utc = field_validator("deadline")(naive_utc)
+
 class TaskUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     status: Optional[str] = None
     progress: Optional[int] = Field(default=None, ge=0, le=100)  # Only allowed when In Progress
     comment: Optional[str] = None  # New comment to add
+    deadline: Optional[datetime] = None  # Send null explicitly to clear it
+
+    _deadline_utc = field_validator("deadline")(naive_utc)
 
 class TaskOut(BaseModel):
     id: int
@@ -42,8 +55,52 @@ class TaskOut(BaseModel):
     created_at: datetime
     completed_at: Optional[datetime]
     progress: int
+    deadline: Optional[datetime] = None
     comments: List[TaskCommentOut] = []
     activity_log: List[TaskActivityOut] = []
 
     class Config:
         orm_mode = True
+
+class TaskSummary(BaseModel):
+    """Compact task for list views; select it with fields=summary."""
+    id: int
+    title: str
+    status: str
+    progress: int
+
+    class Config:
+        orm_mode = True
+
+
+class TaskBatchRequest(BaseModel):
+    ids: List[int] = Field(max_length=1000)
+    include: List[str] = ["comments", "activity"]
+
+class TaskBatchItem(BaseModel):
+    comments: Optional[List[TaskCommentOut]] = None
+    activity: Optional[List[TaskActivityOut]] = None
+
+
+# Bulk endpoints accept up to this many items per request
+BULK_MAX_ITEMS = 10000
+
+class TaskBulkCreate(BaseModel):
+    tasks: List[TaskCreate] = Field(max_length=BULK_MAX_ITEMS)
+
+class TaskBulkUpdateItem(TaskUpdate):
+    id: int
+
+class TaskBulkUpdate(BaseModel):
+    updates: List[TaskBulkUpdateItem] = Field(max_length=BULK_MAX_ITEMS)
+
+class TaskBulkDelete(BaseModel):
+    ids: List[int] = Field(max_length=BULK_MAX_ITEMS)
+
+class BulkItemResult(BaseModel):
+    id: Optional[int] = None
+    status: str  # "created", "updated", "deleted" or "error"
+    detail: Optional[str] = None
+
+class BulkResult(BaseModel):
+    results: List[BulkItemResult]
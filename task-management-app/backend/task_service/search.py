@@ -0,0 +1,143 @@
+import re
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Words after the first MAX_TERMS are ignored
+MAX_TERMS = 16
+
+
+def terms(q: str) -> list:
+    """The words of a search string; all of them must match (in one task field or one comment)."""
+    return re.findall(r"\w+", q.lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """
+    Full-text index over task titles, descriptions and comments for one database dialect.
+    The index lives in the database and is maintained there (triggers, generated columns),
+    so every write path, bulk statements and user purges included, keeps it in sync.
+    """
+
+    def install(self, conn):
+        """Create the index for existing rows; safe to run again."""
+        raise NotImplementedError
+
+    def search(self, db: Session, words: list, owner, offset: int, limit: int):
+        """Returns ([task ids, best match first], total number of matching tasks)."""
+        raise NotImplementedError
+
+
+class Fts5Backend(SearchBackend):
+    """
+    SQLite FTS5 external-content tables over tasks and task_comments, kept current by
+    triggers. Scores are negated bm25 (title weighted over description, comments lowest),
+    summed per task.
+    """
+    STATEMENTS = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5("
+        "title, description, content='tasks', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS comment_fts USING fts5("
+        "comment, content='task_comments', content_rowid='id', tokenize='porter unicode61')",
+        """CREATE TRIGGER IF NOT EXISTS task_fts_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS task_fts_delete AFTER DELETE ON tasks BEGIN
+            INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS task_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+            INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS comment_fts_insert AFTER INSERT ON task_comments BEGIN
+            INSERT INTO comment_fts(rowid, comment) VALUES (new.id, new.comment);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS comment_fts_delete AFTER DELETE ON task_comments BEGIN
+            INSERT INTO comment_fts(comment_fts, rowid, comment) VALUES ('delete', old.id, old.comment);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS comment_fts_update AFTER UPDATE OF comment ON task_comments BEGIN
+            INSERT INTO comment_fts(comment_fts, rowid, comment) VALUES ('delete', old.id, old.comment);
+            INSERT INTO comment_fts(rowid, comment) VALUES (new.id, new.comment);
+        END""",
+        "INSERT INTO task_fts(task_fts) VALUES ('rebuild')",
+        "INSERT INTO comment_fts(comment_fts) VALUES ('rebuild')",
+    ]
+    HITS = """
+        WITH hits(task_id, score) AS (
+            SELECT rowid, -bm25(task_fts, 10.0, 4.0) FROM task_fts WHERE task_fts MATCH :query
+            UNION ALL
+            SELECT task_comments.task_id, -bm25(comment_fts) FROM comment_fts
+            JOIN task_comments ON task_comments.id = comment_fts.rowid
+            WHERE comment_fts MATCH :query
+        )
+    """
+
+    def install(self, conn):
+        for statement in self.STATEMENTS:
+            conn.execute(text(statement))
+
+    def search(self, db: Session, words: list, owner, offset: int, limit: int):
+        # Each word quoted so FTS5 query syntax in user input is matched literally
+        query = " ".join(f'"{word}"' for word in words)
+        return ranked(db, self.HITS, {"query": query}, owner, offset, limit)
+
+
+class PostgresBackend(SearchBackend):
+    """Generated tsvector columns with GIN indexes; scores are ts_rank summed per task."""
+    STATEMENTS = [
+        "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING GIN (search_vector)",
+        "ALTER TABLE task_comments ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(comment, '')), 'C')) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_task_comments_search_vector ON task_comments USING GIN (search_vector)",
+    ]
+    HITS = """
+        WITH query AS (SELECT plainto_tsquery('english', :query) AS q),
+        hits(task_id, score) AS (
+            SELECT tasks.id, ts_rank(tasks.search_vector, query.q) FROM tasks, query
+            WHERE tasks.search_vector @@ query.q
+            UNION ALL
+            SELECT task_comments.task_id, ts_rank(task_comments.search_vector, query.q) FROM task_comments, query
+            WHERE task_comments.search_vector @@ query.q
+        )
+    """
+
+    def install(self, conn):
+        for statement in self.STATEMENTS:
+            conn.execute(text(statement))
+
+    def search(self, db: Session, words: list, owner, offset: int, limit: int):
+        return ranked(db, self.HITS, {"query": " ".join(words)}, owner, offset, limit)
+
+
+def ranked(db: Session, hits: str, params: dict, owner, offset: int, limit: int):
+    """Group a backend's hits(task_id, score) CTE per task, scope to the owner and page it."""
+    where = "WHERE tasks.owner = :owner" if owner is not None else ""
+    grouped = f"{hits} SELECT tasks.id, SUM(hits.score) AS score FROM hits JOIN tasks ON tasks.id = hits.task_id {where} GROUP BY tasks.id"
+    params = {**params, "owner": owner, "offset": offset, "limit": limit}
+    rows = db.execute(text(f"""
+        SELECT id, COUNT(*) OVER () FROM ({grouped}) AS matches
+        ORDER BY score DESC, id LIMIT :limit OFFSET :offset
+    """), params).all()
+    if rows:
+        return [row[0] for row in rows], rows[0][1]
+    if offset == 0:
+        return [], 0
+    # Past the last page the window count has no rows to ride on
+    return [], db.execute(text(f"SELECT COUNT(*) FROM ({grouped}) AS matches"), params).scalar()
+
+
+BACKENDS = {"sqlite": Fts5Backend(), "postgresql": PostgresBackend()}
+
+
+def backend_for(dialect_name: str):
+    """The search backend for a database dialect, or None when search is not supported there."""
+    return BACKENDS.get(dialect_name)
+
+
+def install(conn):
+    """Migration step: create the search index on databases that have a backend."""
+    backend = backend_for(conn.dialect.name)
+    if backend is not None:
+        backend.install(conn)
@@ -1,10 +1,17 @@
 ADMIN_USERNAME = "testuser1"
 ADMIN_PASSWORD = "TestPass123!"
 
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+import threading
+import time
 import pytest
 import requests
+from sqlalchemy import select, func, text, event
 from fastapi.testclient import TestClient
 from task_service.main import app
+from task_service import database, models, rollups, dashboard_cache, deadlines, activity_log, repository, changes, user_deletion
 
 client = TestClient(app)
 
@@ -65,7 +72,7 @@ def test_get_tasks():
     - Register and login as a backend developer
     - Create a task (e.g., 'Build REST API for Tasks')
     - Get all tasks
-    - Assert the response is a list
+    - Assert the response is a list, documented as a list of TaskOut in the OpenAPI schema
     """
     print("\n[TEST] test_get_tasks: Register a backend dev, create an API task, and get all tasks for the user.")
     username = "backenddev"
@@ -78,6 +85,162 @@ def test_get_tasks():
     print(f"[GET TASKS RESPONSE] status: {response.status_code}, response: {response.json()}")
     assert response.status_code == 200
     assert isinstance(response.json(), list)
+    # The streamed list is still described in the OpenAPI schema
+    schema = client.get("/openapi.json").json()["paths"]["/tasks"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema["type"] == "array" and schema["items"]["$ref"].endswith("/TaskOut")
+
+def test_get_tasks_paginated():
+    """
+    Test: Page through a user's tasks with a keyset cursor and without embedded children.
+    Steps:
+    - Register and login as a data engineer
+    - Create three tasks
+    - Fetch pages of two tasks following X-Next-Cursor
+    - Assert pages do not overlap and comments/activity are left out
+    """
+    print("\n[TEST] test_get_tasks_paginated: Register data engineer, create tasks, page through them with a cursor.")
+    username = "dataengineer"
+    password = "DataEng123!"
+    token = get_token(username, password)
+    headers = {"Authorization": f"Bearer {token}"}
+    for title in ["Design ETL job", "Load staging tables", "Validate row counts"]:
+        client.post("/tasks", json={"title": title, "description": "Pipeline work"}, headers=headers)
+    seen = []
+    params = {"limit": 2, "include": ""}
+    while True:
+        response = client.get("/tasks", params=params, headers=headers)
+        print(f"[GET TASKS PAGE RESPONSE] status: {response.status_code}, cursor: {response.headers.get('x-next-cursor')}, response: {response.json()}")
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        assert all("comments" not in t and "activity_log" not in t for t in page)
+        seen.extend(t["id"] for t in page)
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+        params["cursor"] = cursor
+    assert len(seen) == len(set(seen)) >= 3
+    assert seen == sorted(seen)
+
+def test_get_tasks_selected_fields():
+    """
+    Test: Fetch tasks and a single task with only the requested fields.
+    Steps:
+    - Register and login as a product owner
+    - Create a task and comment on it
+    - List tasks with fields=summary and a single task with fields=title,comments
+    - Assert only the requested fields (plus id) are returned and unknown fields are rejected
+    """
+    print("\n[TEST] test_get_tasks_selected_fields: Register product owner, create task, fetch with field selection.")
+    username = "productowner"
+    password = "ProdOwner123!"
+    token = get_token(username, password)
+    headers = {"Authorization": f"Bearer {token}"}
+    task_id = client.post("/tasks", json={"title": "Groom backlog", "description": "Sprint prep"}, headers=headers).json()["id"]
+    client.put(f"/tasks/{task_id}", json={"comment": "Top ten items ready"}, headers=headers)
+    response = client.get("/tasks", params={"fields": "summary"}, headers=headers)
+    print(f"[GET TASKS SUMMARY RESPONSE] status: {response.status_code}, response: {response.json()}")
+    assert response.status_code == 200
+    assert response.json() and all(set(t) == {"id", "title", "status", "progress"} for t in response.json())
+    response = client.get(f"/tasks/{task_id}", params={"fields": "title,comments"}, headers=headers)
+    print(f"[GET TASK FIELDS RESPONSE] status: {response.status_code}, response: {response.json()}")
+    assert response.status_code == 200
+    task = response.json()
+    assert set(task) == {"id", "title", "comments"}
+    assert [c["comment"] for c in task["comments"]] == ["Top ten items ready"]
+    response = client.get("/tasks", params={"fields": "title,secret"}, headers=headers)
+    print(f"[GET TASKS BAD FIELDS RESPONSE] status: {response.status_code}, response: {response.json()}")
+    assert response.status_code == 400
+
+def test_get_tasks_fast_path_matches():
+    """
+    Test: The fast serialization path returns the same payload as the default one.
+    Steps:
+    - Register and login as a release manager
+    - Create a task, comment on it and move it to In Progress
+    - Fetch /tasks with and without fast=true (full and summary fields)
+    - Assert the payloads are identical
+    """
+    print("\n[TEST] test_get_tasks_fast_path_matches: Register release manager, create task, compare fast and default listings.")
+    username = "releasemanager"
+    password = "Release123!"
+    token = get_token(username, password)
+    headers = {"Authorization": f"Bearer {token}"}
+    task_id = client.post("/tasks", json={"title": "Cut release branch", "description": "v2.1"}, headers=headers).json()["id"]
+    client.put(f"/tasks/{task_id}", json={"status": "In Progress", "comment": "Branch cut"}, headers=headers)
+    for params in [{}, {"fields": "summary"}]:
+        default = client.get("/tasks", params=params, headers=headers)
+        fast = client.get("/tasks", params={**params, "fast": "true"}, headers=headers)
+        print(f"[GET TASKS FAST RESPONSE] params: {params}, status: {fast.status_code}, response: {fast.json()}")
+        assert fast.status_code == 200
+        assert fast.json() == default.json()
+
+def test_get_tasks_created_range_with_offset_timestamps():
+    """
+    Test: created_from/created_to with a UTC offset are compared as instants, not wall-clock times.
+    Steps:
+    - Register and login as a timezone tester and create a task
+    - List tasks with bounds 30 minutes around now, written in +05:00 and -05:00
+    - Assert the task is inside the range, and outside it once the bounds are shifted past it
+    """
+    print("\n[TEST] test_get_tasks_created_range_with_offset_timestamps: Filter tasks by created_at with offset timestamps.")
+    headers = {"Authorization": f"Bearer {get_token('timezonetester', 'Timezone123!')}"}
+    task_id = client.post("/tasks", json={"title": "Offset bounds", "description": "Created now"}, headers=headers).json()["id"]
+    now = datetime.now(timezone.utc)
+    east, west = timezone(timedelta(hours=5)), timezone(timedelta(hours=-5))
+
+    def listed(start, end):
+        params = {"fields": "id", "created_from": start.isoformat(), "created_to": end.isoformat()}
+        resp = client.get("/tasks", params=params, headers=headers)
+        print(f"[GET TASKS CREATED RANGE] params: {params}, status: {resp.status_code}, response: {resp.json()}")
+        assert resp.status_code == 200
+        return [task["id"] for task in resp.json()]
+
+    assert listed((now - timedelta(minutes=30)).astimezone(east), (now + timedelta(minutes=30)).astimezone(west)) == [task_id]
+    assert listed((now + timedelta(minutes=30)).astimezone(east), (now + timedelta(hours=1)).astimezone(west)) == []
+
+def test_bulk_create_update_delete():
+    """
+    Test: Create, update and delete tasks in bulk with per-item results.
+    Steps:
+    - Register and login as a migration engineer
+    - Bulk create three tasks
+    - Bulk update two of them (plus an unknown id), one to Done with a comment
+    - Bulk delete two of them (plus an unknown id)
+    - Assert per-item statuses and the resulting task list
+    """
+    print("\n[TEST] test_bulk_create_update_delete: Register migration engineer, bulk create/update/delete tasks.")
+    username = "migrationeng"
+    password = "Migrate123!"
+    token = get_token(username, password)
+    headers = {"Authorization": f"Bearer {token}"}
+    created = client.post("/tasks/bulk", json={"tasks": [
+        {"title": "Import epics", "description": "From old tracker"},
+        {"title": "Import stories", "description": "From old tracker"},
+        {"title": "Import bugs", "description": "From old tracker", "status": "In Progress"},
+    ]}, headers=headers)
+    print(f"[BULK CREATE RESPONSE] status: {created.status_code}, response: {created.json()}")
+    assert created.status_code == 200
+    ids = [r["id"] for r in created.json()["results"]]
+    assert len(ids) == 3 and all(r["status"] == "created" for r in created.json()["results"])
+    updated = client.patch("/tasks/bulk", json={"updates": [
+        {"id": ids[0], "status": "Done", "comment": "Imported 42 epics."},
+        {"id": ids[1], "title": "Import user stories"},
+        {"id": 999999, "title": "Missing"},
+    ]}, headers=headers)
+    print(f"[BULK UPDATE RESPONSE] status: {updated.status_code}, response: {updated.json()}")
+    assert updated.status_code == 200
+    assert [r["status"] for r in updated.json()["results"]] == ["updated", "updated", "error"]
+    done = client.get(f"/tasks/{ids[0]}", headers=headers).json()
+    assert done["status"] == "Done" and done["progress"] == 100
+    assert any(c["comment"] == "Imported 42 epics." for c in done["comments"])
+    assert {a["action"] for a in done["activity_log"]} >= {"status_change", "comment"}
+    deleted = client.request("DELETE", "/tasks/bulk", json={"ids": [ids[1], ids[2], 999999]}, headers=headers)
+    print(f"[BULK DELETE RESPONSE] status: {deleted.status_code}, response: {deleted.json()}")
+    assert deleted.status_code == 200
+    assert [r["status"] for r in deleted.json()["results"]] == ["deleted", "deleted", "error"]
+    remaining = {t["id"] for t in client.get("/tasks", headers=headers).json()}
+    assert ids[0] in remaining and ids[1] not in remaining and ids[2] not in remaining
 
 # Update task
 def test_update_task():
@@ -188,6 +351,337 @@ def test_admin_delete_user():
     if response.status_code == 200:
         assert "deleted" in response.json()["detail"].lower()
 
+def test_task_change_feed_websocket_resume():
+    """
+    Test: Subscribe to the change feed, receive deltas for writes and resume from an event id.
+    Steps:
+    - Register and login as a support agent and as another user
+    - Open the WebSocket feed as the support agent and create a task
+    - Have the other user create a task, then comment on the agent's task
+    - Assert the created/updated/comment events arrive for the agent's task only
+    - Reconnect with last_event_id and assert the same events are replayed
+    """
+    print("\n[TEST] test_task_change_feed_websocket_resume: Subscribe to the feed, write tasks, resume from an event id.")
+    token = get_token("supportagent", "Support123!")
+    other_token = get_token("feedother", "FeedOther123!")
+    headers = {"Authorization": f"Bearer {token}"}
+    with client.websocket_connect(f"/tasks/changes/ws?token={token}") as ws:
+        task_id = client.post("/tasks", json={"title": "Answer ticket #42"}, headers=headers).json()["id"]
+        created = ws.receive_json()
+        print(f"[FEED EVENT] {created}")
+        assert created["type"] == "task.created" and created["task_id"] == task_id
+        assert created["data"]["title"] == "Answer ticket #42"
+        client.post("/tasks", json={"title": "Not for the agent"}, headers={"Authorization": f"Bearer {other_token}"})
+        client.put(f"/tasks/{task_id}", json={"status": "In Progress", "comment": "Customer replied"}, headers=headers)
+        received = [ws.receive_json() for _ in range(4)]
+        print(f"[FEED EVENTS] {received}")
+    assert [e["type"] for e in received] == ["task.updated", "comment.created", "activity.created", "activity.created"]
+    assert all(e["owner"] == "supportagent" and e["task_id"] == task_id for e in received)
+    assert received[0]["data"]["status"] == "In Progress"
+    with client.websocket_connect(f"/tasks/changes/ws?token={token}&last_event_id={created['id']}") as ws:
+        replayed = [ws.receive_json() for _ in range(4)]
+        print(f"[FEED REPLAY] {replayed}")
+    assert [e["id"] for e in replayed] == [e["id"] for e in received]
+    with pytest.raises(Exception):
+        with client.websocket_connect("/tasks/changes/ws?token=invalid") as ws:
+            ws.receive_json()
+
+def test_change_feed_resets_when_resuming_ahead():
+    """
+    Test: A Last-Event-ID ahead of the feed (from before a restart) gets a reset, then the feed.
+    Steps:
+    - Publish three events to a fresh in-memory backend
+    - Assert read(500) is incomplete and starts over from the oldest event
+    - Subscribe from 500 and assert a reset comes first, followed by the three events
+    - Assert an empty feed also resets a subscriber that resumes ahead of it
+    """
+    print("\n[TEST] test_change_feed_resets_when_resuming_ahead: Resume from an id the feed has not reached.")
+    backend = changes.MemoryBackend()
+    backend.append([changes.event("task.created", "restarted", n) for n in range(1, 4)])
+    events, complete = backend.read(500)
+    print(f"[READ AHEAD] ids: {[e['id'] for e in events]}, complete: {complete}")
+    assert not complete and [e["id"] for e in events] == [1, 2, 3]
+    assert backend.read(3) == ([], True)
+
+    async def first_batches(broker, count):
+        subscription = broker.subscribe(500)
+        try:
+            return [await subscription.__anext__() for _ in range(count)]
+        finally:
+            await subscription.aclose()
+
+    reset, replayed = asyncio.run(first_batches(changes.Broker(backend), 2))
+    assert [e["type"] for e in reset] == ["reset"] and reset[0]["id"] == 0
+    assert [e["id"] for e in replayed] == [1, 2, 3]
+    empty = asyncio.run(first_batches(changes.Broker(changes.MemoryBackend()), 1))
+    assert [e["type"] for e in empty[0]] == ["reset"]
+
+def test_conditional_get_with_etags():
+    """
+    Test: Reads carry weak ETags and repeat requests with If-None-Match get 304 until a write.
+    Steps:
+    - Register and login as an analyst
+    - Create a task and read /tasks, /tasks/{id} and /dashboard/status
+    - Repeat with If-None-Match and assert 304 with no body
+    - Update the task and assert the same tags now get 200 with a new ETag
+    - Assert another user's write does not change the analyst's tags
+    """
+    print("\n[TEST] test_conditional_get_with_etags: Register analyst, read with ETags, write, read again.")
+    token = get_token("analyst", "Analyst123!")
+    headers = {"Authorization": f"Bearer {token}"}
+    task_id = client.post("/tasks", json={"title": "Quarterly report"}, headers=headers).json()["id"]
+    urls = ["/tasks", f"/tasks/{task_id}", "/dashboard/status"]
+    tags = {}
+    for url in urls:
+        response = client.get(url, headers=headers)
+        tags[url] = response.headers.get("etag")
+        print(f"[ETAG] {url}: {tags[url]}")
+        assert response.status_code == 200 and tags[url].startswith('W/"')
+        cached = client.get(url, headers={**headers, "If-None-Match": tags[url]})
+        print(f"[CONDITIONAL GET] {url}: status {cached.status_code}")
+        assert cached.status_code == 304 and cached.content == b""
+    other_token = get_token("etagother", "EtagOther123!")
+    client.post("/tasks", json={"title": "Unrelated"}, headers={"Authorization": f"Bearer {other_token}"})
+    assert client.get("/tasks", headers={**headers, "If-None-Match": tags["/tasks"]}).status_code == 304
+    client.put(f"/tasks/{task_id}", json={"status": "In Progress", "progress": 30}, headers=headers)
+    for url in urls:
+        response = client.get(url, headers={**headers, "If-None-Match": tags[url]})
+        print(f"[CONDITIONAL GET AFTER WRITE] {url}: status {response.status_code}, etag {response.headers.get('etag')}")
+        assert response.status_code == 200
+        assert response.headers["etag"] != tags[url]
+
+def test_admin_etag_derived_from_owner_versions():
+    """
+    Test: Admin-wide ETags change with any owner's write, without a shared version row.
+    Steps:
+    - Read /dashboard/status as admin and repeat with If-None-Match (304)
+    - Create a task as another user and assert the admin tag changed (200)
+    - Assert writes only touched per-owner version rows
+    """
+    print("\n[TEST] test_admin_etag_derived_from_owner_versions: Admin reads, user writes, admin reads again.")
+    admin_headers = {"Authorization": f"Bearer {get_token(ADMIN_USERNAME, ADMIN_PASSWORD)}"}
+    headers = {"Authorization": f"Bearer {get_token('versionwriter', 'Version123!')}"}
+    first = client.get("/dashboard/status", headers=admin_headers)
+    tag = first.headers["etag"]
+    assert client.get("/dashboard/status", headers={**admin_headers, "If-None-Match": tag}).status_code == 304
+    client.post("/tasks", json={"title": "Bump my version"}, headers=headers)
+    second = client.get("/dashboard/status", headers={**admin_headers, "If-None-Match": tag})
+    print(f"[ADMIN ETAG] before: {tag}, after: {second.headers.get('etag')}, status: {second.status_code}")
+    assert second.status_code == 200 and second.headers["etag"] != tag
+    db = database.SessionLocal()
+    try:
+        assert db.get(models.OwnerVersion, "*") is None
+        assert db.get(models.OwnerVersion, "versionwriter").version >= 1
+    finally:
+        db.close()
+
+def test_user_named_star_reads_only_own_tasks():
+    """
+    Test: A non-admin whose username is "*" is not treated as an Admin-wide read.
+    Steps:
+    - Create a task as another user, then register and login as "*" and create one task
+    - Assert /dashboard/status, /dashboard and /tasks/search only count the "*" user's task
+    """
+    print("\n[TEST] test_user_named_star_reads_only_own_tasks: A user named '*' reads dashboards and search.")
+    other = {"Authorization": f"Bearer {get_token('starneighbour', 'Neighbour123!')}"}
+    client.post("/tasks", json={"title": "Neighbour starlight task"}, headers=other)
+    headers = {"Authorization": f"Bearer {get_token('*', 'StarUser123!')}"}
+    client.post("/tasks", json={"title": "Own starlight task"}, headers=headers)
+    status = client.get("/dashboard/status", headers=headers).json()
+    combined = client.get("/dashboard", params={"sections": "status"}, headers=headers).json()
+    found = client.get("/tasks/search", params={"q": "starlight"}, headers=headers)
+    print(f"[STAR USER] status: {status}, dashboard: {combined}, search: {found.json()}")
+    assert status == [{"status": "To Do", "value": 1}]
+    assert combined["status"] == status
+    assert [task["title"] for task in found.json()] == ["Own starlight task"]
+    assert found.headers["X-Total-Count"] == "1"
+
+def test_dashboard_cache_hits_and_invalidation():
+    """
+    Test: Repeat dashboard reads are served from the cache until a write changes the data.
+    Steps:
+    - Login as admin and create a task for a new user
+    - Read /dashboard/status twice for that user and assert the cache hit count went up
+    - Update the task and assert the next read is a miss with the new numbers
+    """
+    print("\n[TEST] test_dashboard_cache_hits_and_invalidation: Read dashboards twice, write, read again.")
+    get_token("cacheuser", "CacheUser123!")
+    admin_headers = {"Authorization": f"Bearer {get_token(ADMIN_USERNAME, ADMIN_PASSWORD)}"}
+    task_id = client.post("/tasks", json={"title": "Warm the cache", "owner": "cacheuser"}, headers=admin_headers).json()["id"]
+    before = client.get("/dashboard/cache", headers=admin_headers).json()
+    first = client.get("/dashboard/status", params={"user": "cacheuser"}, headers=admin_headers).json()
+    second = client.get("/dashboard/status", params={"user": "cacheuser"}, headers=admin_headers).json()
+    after = client.get("/dashboard/cache", headers=admin_headers).json()
+    print(f"[CACHE STATS] before: {before}, after: {after}")
+    assert first == second == [{"status": "To Do", "value": 1}]
+    assert after["misses"] == before["misses"] + 1 and after["hits"] == before["hits"] + 1
+    client.put(f"/tasks/{task_id}", json={"status": "Done"}, headers=admin_headers)
+    third = client.get("/dashboard/status", params={"user": "cacheuser"}, headers=admin_headers).json()
+    stats = client.get("/dashboard/cache", headers=admin_headers).json()
+    print(f"[CACHE AFTER WRITE] response: {third}, stats: {stats}")
+    assert third == [{"status": "Done", "value": 1}]
+    assert stats["misses"] == after["misses"] + 1
+    user_headers = {"Authorization": f"Bearer {get_token('cacheuser', 'CacheUser123!')}"}
+    assert client.get("/dashboard/cache", headers=user_headers).status_code == 403
+
+def test_dashboard_cache_single_flight():
+    """
+    Test: Concurrent misses on one key compute the value once.
+    Steps:
+    - Start eight threads reading the same key from a fresh cache with a slow compute
+    - Assert compute ran once and every thread got its result
+    """
+    print("\n[TEST] test_dashboard_cache_single_flight: Eight concurrent misses on one key.")
+    cache = dashboard_cache.DashboardCache(dashboard_cache.MemoryBackend())
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute(("*", "tag"), compute))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"[SINGLE FLIGHT] calls: {len(calls)}, stats: {cache.stats()}")
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 8
+    assert cache.stats()["misses"] == 1 and cache.stats()["coalesced"] == 7
+
+def test_combined_dashboard_matches_widgets():
+    """
+    Test: GET /dashboard returns the same widgets as the individual dashboard endpoints.
+    Steps:
+    - Register and login as a team lead, create tasks and complete one
+    - Compare /dashboard with each /dashboard/<section> for the team lead and for admin
+    - Assert sections= limits the response and user_summary is admin only
+    """
+    print("\n[TEST] test_combined_dashboard_matches_widgets: Compare /dashboard with the per-widget endpoints.")
+    headers = {"Authorization": f"Bearer {get_token('teamlead', 'TeamLead123!')}"}
+    admin_headers = {"Authorization": f"Bearer {get_token(ADMIN_USERNAME, ADMIN_PASSWORD)}"}
+    for title in ["Plan sprint", "Review PRs"]:
+        task_id = client.post("/tasks", json={"title": title}, headers=headers).json()["id"]
+    client.put(f"/tasks/{task_id}", json={"status": "Done"}, headers=headers)
+    for h, sections in [(headers, ["status", "productivity", "progress", "upcoming"]), (admin_headers, ["status", "productivity", "progress", "upcoming", "user_summary"])]:
+        combined = client.get("/dashboard", headers=h)
+        print(f"[DASHBOARD RESPONSE] status: {combined.status_code}, response: {combined.json()}")
+        assert combined.status_code == 200
+        assert list(combined.json()) == sections
+        for section in sections:
+            assert combined.json()[section] == client.get(f"/dashboard/{section}", headers=h).json()
+    subset = client.get("/dashboard", params={"sections": "status,progress", "user": "teamlead"}, headers=admin_headers)
+    assert subset.json() == {
+        "status": client.get("/dashboard/status", params={"user": "teamlead"}, headers=admin_headers).json(),
+        "progress": client.get("/dashboard/progress", params={"user": "teamlead"}, headers=admin_headers).json(),
+    }
+    assert client.get("/dashboard", params={"sections": "user_summary"}, headers=headers).status_code == 403
+    assert client.get("/dashboard", params={"sections": "weather"}, headers=headers).status_code == 400
+
+def test_dashboard_productivity_windows_and_granularity():
+    """
+    Test: Productivity reports over custom windows at hour/day/week/month granularity.
+    Steps:
+    - Register and login as a reporter, complete two tasks today
+    - Ask for hour, week and month reports and a per-owner breakdown as admin
+    - Assert today's completions land in the current period and gaps are zero-filled
+    - Assert "Z" and offset bounds are read as UTC
+    - Assert bad granularities and oversized ranges are rejected
+    """
+    print("\n[TEST] test_dashboard_productivity_windows_and_granularity: Complete tasks, report over windows.")
+    headers = {"Authorization": f"Bearer {get_token('reporter', 'Reporter123!')}"}
+    admin_headers = {"Authorization": f"Bearer {get_token(ADMIN_USERNAME, ADMIN_PASSWORD)}"}
+    for title in ["Draft summary", "Publish summary"]:
+        task_id = client.post("/tasks", json={"title": title}, headers=headers).json()["id"]
+        client.put(f"/tasks/{task_id}", json={"status": "Done"}, headers=headers)
+    now = datetime.utcnow()
+    hours = client.get("/dashboard/productivity", params={"granularity": "hour", "from": (now - timedelta(hours=5)).isoformat(), "to": now.isoformat()}, headers=headers)
+    print(f"[PRODUCTIVITY HOURS] status: {hours.status_code}, response: {hours.json()}")
+    assert hours.status_code == 200
+    assert len(hours.json()) == 6
+    assert hours.json()[-1]["date"] == now.strftime("%Y-%m-%dT%H:00")
+    # The two completions fall in the last hour (or the one before, right at the turn of the hour)
+    assert sum(item["completed"] for item in hours.json()[-2:]) == 2
+    assert all(item["completed"] == 0 for item in hours.json()[:-2])
+    months = client.get("/dashboard/productivity", params={"granularity": "month", "from": (now - timedelta(days=365)).date().isoformat()}, headers=headers)
+    print(f"[PRODUCTIVITY MONTHS] status: {months.status_code}, response: {months.json()}")
+    assert len(months.json()) == 13
+    assert months.json()[-1]["date"] == now.strftime("%Y-%m")
+    assert sum(item["completed"] for item in months.json()) == 2
+    weeks = client.get("/dashboard/productivity", params={"granularity": "week", "by_owner": "true", "user": "reporter"}, headers=admin_headers)
+    print(f"[PRODUCTIVITY WEEKS] status: {weeks.status_code}, response: {weeks.json()}")
+    assert sum(item["completed"] for item in weeks.json()) == 2
+    assert {owner for item in weeks.json() for owner in item["by_owner"]} == {"reporter"}
+    # Aware bounds are converted to UTC, with or without `to`
+    zulu = client.get("/dashboard/productivity", params={"from": (now - timedelta(days=2)).strftime("%Y-%m-%dT%H:%M:%SZ")}, headers=headers)
+    print(f"[PRODUCTIVITY FROM Z] status: {zulu.status_code}, response: {zulu.json()}")
+    assert zulu.status_code == 200 and len(zulu.json()) == 3 and sum(item["completed"] for item in zulu.json()) == 2
+    shifted = client.get("/dashboard/productivity", params={"granularity": "hour", "from": (now - timedelta(hours=3)).strftime("%Y-%m-%dT%H:%M:%S+00:00"), "to": (now + timedelta(hours=2)).strftime("%Y-%m-%dT%H:%M:%S+02:00")}, headers=headers)
+    assert shifted.status_code == 200 and shifted.json()[-1]["date"] == now.strftime("%Y-%m-%dT%H:00")
+    assert client.get("/dashboard/productivity", params={"granularity": "fortnight"}, headers=headers).status_code == 400
+    too_long = client.get("/dashboard/productivity", params={"granularity": "hour", "from": (now - timedelta(days=60)).isoformat()}, headers=headers)
+    assert too_long.status_code == 400
+
+def test_admin_delete_user_cascades_in_background():
+    """
+    Test: Admin deletes a user in background mode; tasks, comments and activity go with them.
+    Steps:
+    - Register a contractor and create tasks with a comment
+    - Delete the contractor as admin with ?background=true
+    - Assert 202, the deletion progress report, and that no child rows are left behind
+    """
+    print("\n[TEST] test_admin_delete_user_cascades_in_background: Admin deletes a user with tasks in background mode.")
+    token = get_token("contractor", "Contract123!")
+    headers = {"Authorization": f"Bearer {token}"}
+    task_ids = []
+    for title in ["Audit logs", "Rotate keys"]:
+        task_ids.append(client.post("/tasks", json={"title": title, "description": "Security work"}, headers=headers).json()["id"])
+    client.put(f"/tasks/{task_ids[0]}", json={"comment": "Started audit."}, headers=headers)
+    admin_headers = {"Authorization": f"Bearer {get_token(ADMIN_USERNAME, ADMIN_PASSWORD)}"}
+    response = client.delete("/users/contractor", params={"background": "true"}, headers=admin_headers)
+    print(f"[BACKGROUND DELETE USER RESPONSE] status: {response.status_code}, response: {response.json()}")
+    assert response.status_code == 202
+    progress = client.get("/users/contractor/deletion", headers=admin_headers)
+    print(f"[DELETION PROGRESS RESPONSE] status: {progress.status_code}, response: {progress.json()}")
+    assert progress.status_code == 200
+    assert progress.json()["status"] == "done"
+    assert progress.json()["tasks_deleted"] == progress.json()["tasks_total"] >= 2
+    db = database.SessionLocal()
+    try:
+        assert db.query(models.Task).filter(models.Task.owner == "contractor").count() == 0
+        assert db.query(models.TaskComment).filter(models.TaskComment.task_id.in_(task_ids)).count() == 0
+        assert db.query(models.TaskActivity).filter(models.TaskActivity.task_id.in_(task_ids)).count() == 0
+    finally:
+        db.close()
+    assert all(u["username"] != "contractor" for u in client.get("/users").json())
+
+def test_admin_delete_user_while_purge_running():
+    """
+    Test: Deleting a user whose purge is already running reports it instead of claiming success.
+    Steps:
+    - Register a temp worker with a task and mark their purge as running in this process
+    - Assert run() declines and the synchronous DELETE answers 409 with the progress URL
+    - Assert the task is still there, then delete again once the purge is over and assert 200
+    """
+    print("\n[TEST] test_admin_delete_user_while_purge_running: Delete a user twice concurrently.")
+    headers = {"Authorization": f"Bearer {get_token('tempworker', 'Temp12345!')}"}
+    task_id = client.post("/tasks", json={"title": "Hand over keys"}, headers=headers).json()["id"]
+    admin_headers = {"Authorization": f"Bearer {get_token(ADMIN_USERNAME, ADMIN_PASSWORD)}"}
+    user_deletion._running.add("tempworker")
+    try:
+        assert user_deletion.run("tempworker") is False
+        response = client.delete("/users/tempworker", headers=admin_headers)
+        print(f"[DELETE WHILE RUNNING] status: {response.status_code}, response: {response.json()}")
+        assert response.status_code == 409
+        assert response.json()["progress"] == "/users/tempworker/deletion"
+    finally:
+        user_deletion._running.discard("tempworker")
+    assert client.get(f"/tasks/{task_id}", headers=headers).status_code == 200
+    response = client.delete("/users/tempworker", headers=admin_headers)
+    assert response.status_code == 200 and "deleted" in response.json()["detail"].lower()
+
 def test_list_users():
     """
     Test: List all users. Assert response is a list.
@@ -227,6 +721,36 @@ def test_task_comments_and_activity():
     assert resp2.status_code == 200
     assert any(a["action"] == "comment" for a in resp2.json())
 
+def test_tasks_batch_details():
+    """
+    Test: Fetch comments and activity for several tasks in one batch request.
+    Steps:
+    - Register and login as a technical writer
+    - Create two tasks and comment on one
+    - Request both (plus an unknown id) from /tasks/batch
+    - Assert results are keyed by task id and unknown ids are left out
+    """
+    print("\n[TEST] test_tasks_batch_details: Register writer, create tasks, comment, fetch details in one batch.")
+    username = "techwriter"
+    password = "TechWriter1!"
+    token = get_token(username, password)
+    headers = {"Authorization": f"Bearer {token}"}
+    first = client.post("/tasks", json={"title": "Write API docs", "description": "Document task endpoints"}, headers=headers).json()
+    second = client.post("/tasks", json={"title": "Write setup guide", "description": "Local dev setup"}, headers=headers).json()
+    client.put(f"/tasks/{first['id']}", json={"comment": "Draft ready for review."}, headers=headers)
+    resp = client.post("/tasks/batch", json={"ids": [first["id"], second["id"], 999999]}, headers=headers)
+    print(f"[BATCH DETAILS RESPONSE] status: {resp.status_code}, response: {resp.json()}")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert set(data) == {str(first["id"]), str(second["id"])}
+    assert any(c["comment"] == "Draft ready for review." for c in data[str(first["id"])]["comments"])
+    assert any(a["action"] == "comment" for a in data[str(first["id"])]["activity"])
+    assert data[str(second["id"])]["comments"] == []
+    resp2 = client.post("/tasks/batch", json={"ids": [first["id"]], "include": ["comments"]}, headers=headers)
+    print(f"[BATCH COMMENTS ONLY RESPONSE] status: {resp2.status_code}, response: {resp2.json()}")
+    assert resp2.status_code == 200
+    assert "activity" not in resp2.json()[str(first["id"])]
+
 def test_dashboard_endpoints():
     """
     Test: Dashboard endpoints for progress and upcoming tasks.
@@ -255,6 +779,587 @@ def test_dashboard_endpoints():
     print(f"[DASHBOARD UPCOMING RESPONSE] status: {resp4.status_code}, response: {resp4.json()}")
     assert resp4.status_code == 200
 
+def test_dashboard_rollups_match_rebuild():
+    """
+    Test: Dashboard counters maintained on writes agree with a full rebuild from the tasks table.
+    Steps:
+    - Register and login as a release manager
+    - Create tasks, move one to Done with a comment, delete another
+    - Read the dashboards, rebuild the rollups, read again
+    - Assert both reads are identical and reflect the writes
+    """
+    print("\n[TEST] test_dashboard_rollups_match_rebuild: Register release manager, write tasks, compare rollups with a rebuild.")
+    username = "releasemgr"
+    password = "Release123!"
+    token = get_token(username, password)
+    headers = {"Authorization": f"Bearer {token}"}
+    done = client.post("/tasks", json={"title": "Tag release", "description": "Tag v1.0"}, headers=headers).json()
+    client.post("/tasks", json={"title": "Write changelog", "description": "Summarize changes"}, headers=headers)
+    dropped = client.post("/tasks", json={"title": "Old hotfix", "description": "No longer needed"}, headers=headers).json()
+    client.put(f"/tasks/{done['id']}", json={"status": "Done", "comment": "Tagged."}, headers=headers)
+    client.delete(f"/tasks/{dropped['id']}", headers=headers)
+
+    def read_dashboards():
+        return {path: client.get(f"/dashboard/{path}", headers=headers).json() for path in ["status", "progress", "productivity"]}
+
+    maintained = read_dashboards()
+    print(f"[DASHBOARDS FROM ROLLUPS] {maintained}")
+    db = database.SessionLocal()
+    try:
+        rollups.rebuild(db)
+    finally:
+        db.close()
+    rebuilt = read_dashboards()
+    print(f"[DASHBOARDS AFTER REBUILD] {rebuilt}")
+    assert maintained == rebuilt
+    assert {"status": "Done", "value": 1} in maintained["status"]
+    assert {"status": "To Do", "value": 1} in maintained["status"]
+    assert maintained["productivity"][-1]["completed"] == 1
+    assert sum(b["count"] for b in maintained["progress"]) == 2
+
+def test_rollups_match_rebuild_after_concurrent_writes():
+    """
+    Test: Concurrent updates and deletes of the same tasks apply each transition to the rollups once.
+    Steps:
+    - Register and login as a user and create tasks with comments
+    - From several threads, PUT status changes and DELETE (single and bulk) the same tasks
+    - Assert the maintained rollup rows equal the ones rollups.rebuild() derives
+    """
+    print("\n[TEST] test_rollups_match_rebuild_after_concurrent_writes: Race updates and deletes, compare rollups with a rebuild.")
+    username = "rollupracer"
+    headers = {"Authorization": f"Bearer {get_token(username, 'Racer123!')}"}
+    created = client.post("/tasks/bulk", json={"tasks": [{"title": f"Race {i}"} for i in range(12)]}, headers=headers).json()
+    ids = [item["id"] for item in created["results"]]
+    for task_id in ids:
+        client.put(f"/tasks/{task_id}", json={"comment": "Racing"}, headers=headers)
+    statuses = ["In Progress", "Done", "To Do"]
+
+    def updater(offset):
+        for n, task_id in enumerate(ids):
+            client.put(f"/tasks/{task_id}", json={"status": statuses[(n + offset) % 3]}, headers=headers)
+            client.patch("/tasks/bulk", json={"updates": [{"id": task_id, "status": statuses[(n + offset + 1) % 3]}]}, headers=headers)
+
+    def deleter(chunk):
+        for task_id in chunk:
+            client.delete(f"/tasks/{task_id}", headers=headers)
+            client.request("DELETE", "/tasks/bulk", json={"ids": [task_id]}, headers=headers)
+
+    workers = [threading.Thread(target=updater, args=(i,)) for i in range(3)]
+    workers += [threading.Thread(target=deleter, args=(ids[::-1] if i % 2 else ids,)) for i in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    def rollup_rows():
+        db = database.SessionLocal()
+        try:
+            rows = {}
+            for model in rollups.ROLLUP_MODELS:
+                key = model.user if model is models.UserCommentCount else model.owner
+                rows[model.__tablename__] = sorted(
+                    tuple(str(value) for value in row)
+                    for row in db.execute(select(*model.__table__.columns).where(key == username, model.count != 0))
+                )
+            return rows
+        finally:
+            db.close()
+
+    maintained = rollup_rows()
+    db = database.SessionLocal()
+    try:
+        rollups.rebuild(db)
+    finally:
+        db.close()
+    rebuilt = rollup_rows()
+    print(f"[ROLLUPS MAINTAINED] {maintained}\n[ROLLUPS REBUILT] {rebuilt}")
+    assert maintained == rebuilt
+
+def test_dashboard_user_summary_sorted_and_paged():
+    """
+    Test: Admin user summary sorted by assigned tasks and paginated.
+    Steps:
+    - Login as admin and create tasks for a support engineer
+    - Request the summary sorted by assigned (desc) one row at a time
+    - Assert ordering, page size and the total count header
+    """
+    print("\n[TEST] test_dashboard_user_summary_sorted_and_paged: Admin creates tasks, reads sorted and paged user summary.")
+    get_token("supporteng", "Support123!")
+    admin_token = get_token(ADMIN_USERNAME, ADMIN_PASSWORD)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for title in ["Triage tickets", "Update runbook"]:
+        client.post("/tasks", json={"title": title, "description": "Support work", "owner": "supporteng"}, headers=headers)
+    full = client.get("/dashboard/user_summary", params={"sort": "assigned", "order": "desc"}, headers=headers)
+    print(f"[USER SUMMARY SORTED RESPONSE] status: {full.status_code}, response: {full.json()}")
+    assert full.status_code == 200
+    assigned = [row["assigned"] for row in full.json()]
+    assert assigned == sorted(assigned, reverse=True)
+    assert any(row["username"] == "supporteng" and row["assigned"] >= 2 for row in full.json())
+    page = client.get("/dashboard/user_summary", params={"sort": "assigned", "order": "desc", "offset": 1, "limit": 1}, headers=headers)
+    print(f"[USER SUMMARY PAGE RESPONSE] status: {page.status_code}, total: {page.headers.get('x-total-count')}, response: {page.json()}")
+    assert page.status_code == 200
+    assert page.json() == full.json()[1:2]
+    assert int(page.headers["x-total-count"]) == len(full.json())
+    bad = client.get("/dashboard/user_summary", params={"sort": "password"}, headers=headers)
+    assert bad.status_code == 400
+
+def test_dashboard_progress_custom_buckets():
+    """
+    Test: Progress dashboard with custom bucket edges.
+    Steps:
+    - Register and login as a UX designer
+    - Create tasks at 5% and 60% progress
+    - Request progress with buckets 0,10,50,90,100
+    - Assert labels and counts per bucket, also for a single 0,100 bucket, and that invalid edges are rejected
+    """
+    print("\n[TEST] test_dashboard_progress_custom_buckets: Register designer, set progress, check custom buckets.")
+    username = "uxdesigner"
+    password = "UXdesign123!"
+    token = get_token(username, password)
+    headers = {"Authorization": f"Bearer {token}"}
+    for title, progress in [("Wireframes", 5), ("Style guide", 60)]:
+        task = client.post("/tasks", json={"title": title, "description": "Design work"}, headers=headers).json()
+        client.put(f"/tasks/{task['id']}", json={"status": "In Progress", "progress": progress}, headers=headers)
+    resp = client.get("/dashboard/progress", params={"buckets": "0,10,50,90,100"}, headers=headers)
+    print(f"[DASHBOARD PROGRESS BUCKETS RESPONSE] status: {resp.status_code}, response: {resp.json()}")
+    assert resp.status_code == 200
+    assert resp.json() == [
+        {"range": "0-10%", "count": 1},
+        {"range": "11-50%", "count": 0},
+        {"range": "51-90%", "count": 1},
+        {"range": "91-100%", "count": 0},
+    ]
+    single = client.get("/dashboard/progress", params={"buckets": "0,100"}, headers=headers)
+    print(f"[DASHBOARD PROGRESS SINGLE BUCKET RESPONSE] status: {single.status_code}, response: {single.json()}")
+    assert single.status_code == 200
+    assert single.json() == [{"range": "0-100%", "count": 2}]
+    combined = client.get("/dashboard", params={"sections": "progress", "buckets": "0,100"}, headers=headers)
+    assert combined.status_code == 200 and combined.json()["progress"] == single.json()
+    bad = client.get("/dashboard/progress", params={"buckets": "50,10"}, headers=headers)
+    print(f"[DASHBOARD PROGRESS BAD BUCKETS RESPONSE] status: {bad.status_code}, response: {bad.json()}")
+    assert bad.status_code == 400
+
+def test_task_deadlines_and_upcoming():
+    """
+    Test: Deadlines on tasks and the upcoming dashboard.
+    Steps:
+    - Register and login as a release manager
+    - Create tasks due in 1, 2 and 3 days, one overdue, one due in 30 days and one Done
+    - Page through /dashboard/upcoming with limit=2 and the X-Next-Cursor header
+    - Assert only open tasks in the window come back, soonest first, and overdue=true lists the late one
+    - Clear a deadline with an explicit null and assert it leaves the window
+    """
+    print("\n[TEST] test_task_deadlines_and_upcoming: Create tasks with deadlines, page through upcoming.")
+    username = "releasemgr"
+    password = "Release123!"
+    token = get_token(username, password)
+    headers = {"Authorization": f"Bearer {token}"}
+    now = datetime.utcnow().replace(microsecond=0)
+    ids = {}
+    for title, offset in [("Day 2", 2), ("Day 1", 1), ("Day 3", 3), ("Late", -1), ("Next month", 30), ("Shipped", 1)]:
+        resp = client.post("/tasks", json={"title": title, "description": "Release work", "deadline": (now + timedelta(days=offset)).isoformat()}, headers=headers)
+        assert resp.status_code == 200
+        assert resp.json()["deadline"] == (now + timedelta(days=offset)).isoformat()
+        ids[title] = resp.json()["id"]
+    client.put(f"/tasks/{ids['Shipped']}", json={"status": "Done"}, headers=headers)
+    titles, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        resp = client.get("/dashboard/upcoming", params=params, headers=headers)
+        print(f"[UPCOMING PAGE RESPONSE] status: {resp.status_code}, response: {resp.json()}")
+        assert resp.status_code == 200
+        titles += [item["title"] for item in resp.json()]
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert titles == ["Day 1", "Day 2", "Day 3"]
+    overdue = client.get("/dashboard/upcoming", params={"overdue": "true"}, headers=headers).json()
+    print(f"[OVERDUE RESPONSE] {overdue}")
+    assert [item["title"] for item in overdue] == ["Late"]
+    month = client.get("/dashboard/upcoming", params={"days": 31}, headers=headers).json()
+    assert [item["title"] for item in month] == ["Day 1", "Day 2", "Day 3", "Next month"]
+    cleared = client.put(f"/tasks/{ids['Day 2']}", json={"deadline": None}, headers=headers)
+    assert cleared.status_code == 200 and cleared.json()["deadline"] is None
+    assert any(a["action"] == "deadline_change" for a in cleared.json()["activity_log"])
+    upcoming = client.get("/dashboard/upcoming", headers=headers).json()
+    assert [item["title"] for item in upcoming] == ["Day 1", "Day 3"]
+    bad = client.get("/dashboard/upcoming", params={"cursor": "nope"}, headers=headers)
+    assert bad.status_code == 400
+
+def test_deadline_scheduler_due_soon_and_overdue():
+    """
+    Test: The deadline scheduler fires due-soon and overdue events from its heap.
+    Steps:
+    - Create a scheduler with a 10 minute lead and a controllable clock
+    - Track two tasks, retrack one to a later deadline and untrack a third
+    - Advance the clock and assert the events popped at each step
+    """
+    print("\n[TEST] test_deadline_scheduler_due_soon_and_overdue: Track deadlines and advance a fake clock.")
+    now = [datetime(2024, 1, 1, 12, 0)]
+    scheduler = deadlines.DeadlineScheduler(publish=lambda events: None, lead=timedelta(minutes=10), clock=lambda: now[0])
+    scheduler.track(1, "alice", "Soon", datetime(2024, 1, 1, 12, 20), "To Do")
+    scheduler.track(2, "bob", "Later", datetime(2024, 1, 1, 12, 30), "In Progress")
+    scheduler.track(3, "alice", "Dropped", datetime(2024, 1, 1, 12, 15), "To Do")
+    scheduler.untrack(3)
+    scheduler.track(2, "bob", "Later", datetime(2024, 1, 1, 13, 0), "In Progress")
+    assert scheduler.pop_due() == []
+    now[0] = datetime(2024, 1, 1, 12, 12)
+    fired = [(e["type"], e["task_id"]) for e in scheduler.pop_due()]
+    print(f"[FIRED AT 12:12] {fired}")
+    assert fired == [("task.due_soon", 1)]
+    now[0] = datetime(2024, 1, 1, 13, 0)
+    fired = [(e["type"], e["task_id"]) for e in scheduler.pop_due()]
+    print(f"[FIRED AT 13:00] {fired}")
+    assert fired == [("task.overdue", 1), ("task.due_soon", 2), ("task.overdue", 2)]
+    now[0] = datetime(2024, 1, 2, 12, 0)
+    assert scheduler.pop_due() == []
+
+def test_search_tasks():
+    """
+    Test: Full-text search over titles, descriptions and comments.
+    Steps:
+    - Register and login as two support engineers and create tasks for each
+    - Search by a title word, a description word and a comment word
+    - Assert ranking (title match first), owner scoping and pagination headers
+    - Rename and delete tasks and assert the index follows
+    """
+    print("\n[TEST] test_search_tasks: Create tasks and comments, search them.")
+    token = get_token("supportone", "Support123!")
+    headers = {"Authorization": f"Bearer {token}"}
+    other = {"Authorization": f"Bearer {get_token('supporttwo', 'Support123!')}"}
+    ids = {}
+    for title, description in [
+        ("Investigate printer outage", "Floor 3 printers offline"),
+        ("Replace toner", "The printer on floor 2 is out of toner"),
+        ("Renew certificates", "TLS certificates expire soon"),
+    ]:
+        ids[title] = client.post("/tasks", json={"title": title, "description": description}, headers=headers).json()["id"]
+    client.post("/tasks", json={"title": "Printer inventory", "description": "Count printers"}, headers=other)
+    client.put(f"/tasks/{ids['Renew certificates']}", json={"comment": "Blocked on the printer vendor portal"}, headers=headers)
+
+    resp = client.get("/tasks/search", params={"q": "printer", "fields": "summary"}, headers=headers)
+    print(f"[SEARCH RESPONSE] status: {resp.status_code}, total: {resp.headers.get('X-Total-Count')}, response: {resp.json()}")
+    assert resp.status_code == 200
+    assert resp.headers["X-Total-Count"] == "3"
+    titles = [task["title"] for task in resp.json()]
+    assert set(titles) == {"Investigate printer outage", "Replace toner", "Renew certificates"}
+    assert titles[0] == "Investigate printer outage"
+    assert titles[-1] == "Renew certificates"
+
+    page = client.get("/tasks/search", params={"q": "printer", "limit": 2, "offset": 2}, headers=headers)
+    assert [task["title"] for task in page.json()] == titles[2:]
+    assert page.headers["X-Total-Count"] == "3"
+    assert [task["title"] for task in client.get("/tasks/search", params={"q": "TLS expire"}, headers=headers).json()] == ["Renew certificates"]
+    assert client.get("/tasks/search", params={"q": "printer outage toner"}, headers=headers).json() == []
+
+    client.put(f"/tasks/{ids['Investigate printer outage']}", json={"title": "Investigate scanner outage"}, headers=headers)
+    client.delete(f"/tasks/{ids['Replace toner']}", headers=headers)
+    resp = client.get("/tasks/search", params={"q": "printer outage"}, headers=headers)
+    print(f"[SEARCH AFTER RENAME/DELETE] {resp.json()}")
+    assert [task["title"] for task in resp.json()] == ["Investigate scanner outage"]
+    assert [task["title"] for task in client.get("/tasks/search", params={"q": "scanner"}, headers=headers).json()] == ["Investigate scanner outage"]
+    assert [task["title"] for task in client.get("/tasks/search", params={"q": "printers"}, headers=other).json()] == ["Printer inventory"]
+    assert client.get("/tasks/search", params={"q": "?!"}, headers=headers).status_code == 400
+
+def test_activity_and_comments_pagination_with_archive():
+    """
+    Test: Cursor pagination of comments and activity, including archived activity.
+    Steps:
+    - Register and login as a project lead and comment on a task five times
+    - Page comments and activity with limit=2 and the X-Next-Cursor header
+    - Backdate the first activity entries and archive them
+    - Assert they leave the default view and come back, in order, with archived=true
+    - Assert another user gets 403 for the archived view
+    """
+    print("\n[TEST] test_activity_and_comments_pagination_with_archive: Page comments/activity, archive old entries.")
+    token = get_token("projectlead", "Lead12345!")
+    headers = {"Authorization": f"Bearer {token}"}
+    task_id = client.post("/tasks", json={"title": "Long running", "description": "Many updates"}, headers=headers).json()["id"]
+    for n in range(5):
+        client.put(f"/tasks/{task_id}", json={"comment": f"Update {n}"}, headers=headers)
+
+    def pages(path, **params):
+        items, cursor = [], None
+        while True:
+            resp = client.get(path, params={"limit": 2, **params, **({"cursor": cursor} if cursor else {})}, headers=headers)
+            assert resp.status_code == 200 and len(resp.json()) <= 2
+            items += resp.json()
+            cursor = resp.headers.get("X-Next-Cursor")
+            if not cursor:
+                return items
+
+    comments = pages(f"/tasks/{task_id}/comments")
+    print(f"[PAGED COMMENTS] {[c['comment'] for c in comments]}")
+    assert [c["comment"] for c in comments] == [f"Update {n}" for n in range(5)]
+    activity = client.get(f"/tasks/{task_id}/activity", headers=headers).json()
+    assert len(activity) == 5
+    assert pages(f"/tasks/{task_id}/activity") == activity
+
+    old_ids = [entry["id"] for entry in activity[:3]]
+    with database.engine.begin() as conn:
+        conn.execute(models.TaskActivity.__table__.update().where(models.TaskActivity.id.in_(old_ids)).values(timestamp=datetime(2020, 1, 15)))
+    db = database.SessionLocal()
+    try:
+        moved = activity_log.archive(db, datetime(2021, 1, 1))
+    finally:
+        db.close()
+    print(f"[ARCHIVED] {moved} entries")
+    assert moved == 3
+    hot = client.get(f"/tasks/{task_id}/activity", headers=headers).json()
+    assert [entry["id"] for entry in hot] == [entry["id"] for entry in activity[3:]]
+    full = pages(f"/tasks/{task_id}/activity", archived="true")
+    assert [(e["id"], e["detail"]) for e in full] == [(e["id"], e["detail"]) for e in activity]
+    other = {"Authorization": f"Bearer {get_token('projectguest', 'Guest12345!')}"}
+    assert client.get(f"/tasks/{task_id}/activity", params={"archived": "true"}, headers=other).status_code == 403
+
+def test_bulk_update_activity_written_with_the_update():
+    """
+    Test: PATCH /tasks/bulk writes its activity in the update's transaction.
+    Steps:
+    - Register and login as an activity writer, create a task and read it with its ETag
+    - Bulk update the task's status and comment on it
+    - Assert the old ETag no longer matches and the read, the activity endpoint and the table all show the entries
+    """
+    print("\n[TEST] test_bulk_update_activity_written_with_the_update: Bulk update, then read activity at once.")
+    headers = {"Authorization": f"Bearer {get_token('activitywriter', 'Writer123!')}"}
+    task_id = client.post("/tasks", json={"title": "Bulk activity", "description": "Activity target"}, headers=headers).json()["id"]
+    tag = client.get(f"/tasks/{task_id}", headers=headers).headers["etag"]
+    bulk = client.patch("/tasks/bulk", json={"updates": [{"id": task_id, "status": "In Progress", "comment": "Started in bulk"}]}, headers=headers)
+    assert [item["status"] for item in bulk.json()["results"]] == ["updated"]
+    with database.engine.connect() as conn:
+        stored = conn.execute(select(models.TaskActivity.action).where(models.TaskActivity.task_id == task_id).order_by(models.TaskActivity.id)).scalars().all()
+    fetched = client.get(f"/tasks/{task_id}", headers={**headers, "If-None-Match": tag})
+    activity = client.get(f"/tasks/{task_id}/activity", headers=headers).json()
+    print(f"[BULK ACTIVITY] stored: {stored}, fetched: {fetched.status_code}, activity: {activity}")
+    assert stored == ["status_change", "comment"]
+    assert fetched.status_code == 200 and fetched.headers["etag"] != tag
+    assert [entry["action"] for entry in fetched.json()["activity_log"]] == stored
+    assert [entry["action"] for entry in activity] == stored
+
+def test_repository_scoped_lookups_in_one_statement():
+    """
+    Test: Repository lookups resolve visibility and children in a single statement.
+    Steps:
+    - Register and login as a data steward, create a task and comment on it
+    - Count the SQL statements of task_children and get_task with the comments section
+    - Assert one statement each, and that other users get nothing while Admin sees the task
+    - Assert a non-owner's children lookup returns only the owner, in one statement
+    """
+    print("\n[TEST] test_repository_scoped_lookups_in_one_statement: Count statements per scoped lookup.")
+    username = "datasteward"
+    headers = {"Authorization": f"Bearer {get_token(username, 'Steward123!')}"}
+    task_id = client.post("/tasks", json={"title": "Catalog", "description": "Tables"}, headers=headers).json()["id"]
+    client.put(f"/tasks/{task_id}", json={"comment": "First pass done"}, headers=headers)
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db = database.SessionLocal()
+    event.listen(database.engine, "before_cursor_execute", count)
+    try:
+        owner, comments = repository.task_children(db, "comments", task_id, username, "User")
+        print(f"[TASK CHILDREN] owner: {owner}, comments: {[c.comment for c in comments]}, statements: {len(statements)}")
+        assert owner == username and [c.comment for c in comments] == ["First pass done"]
+        assert len(statements) == 1
+        statements.clear()
+        task = repository.get_task(db, task_id, username, "User", {"comments"})
+        print(f"[GET TASK] statements: {len(statements)}")
+        assert len(statements) == 1
+        assert [c.comment for c in task.comments] == ["First pass done"]
+        # The comments came with the task, so reading them issued no lazy load
+        assert len(statements) == 1
+        statements.clear()
+        # A non-owner gets the owner row for the 403, without the children
+        assert repository.task_children(db, "comments", task_id, "someoneelse", "User") == (username, [])
+        assert len(statements) == 1
+    finally:
+        event.remove(database.engine, "before_cursor_execute", count)
+        db.close()
+    db = database.SessionLocal()
+    try:
+        assert repository.get_task(db, task_id, "someoneelse", "User") is None
+        assert repository.get_task(db, task_id, "admin", "Admin").id == task_id
+        assert repository.task_children(db, "comments", 999999, "admin", "Admin") is None
+        assert [c.comment for c in repository.task_children(db, "comments", task_id, "admin", "Admin")[1]] == ["First pass done"]
+        assert repository.visible_tasks(db, [task_id, 999999], "someoneelse", "User") == {}
+    finally:
+        db.close()
+
+def test_write_responses_without_read_back():
+    """
+    Test: Create and update responses are assembled without reading the task back.
+    Steps:
+    - Register and login as an automation bot and record the SQL of each write
+    - Create a task and update it with a comment; assert the responses equal a later GET
+      and that no SELECT ran after the task was written
+    - Send progress updates with Prefer: return=minimal and assert the acknowledgement,
+      a single SELECT per update and the stored progress
+    """
+    print("\n[TEST] test_write_responses_without_read_back: Compare write responses with GET, count statements.")
+    headers = {"Authorization": f"Bearer {get_token('automationbot', 'Automate123!')}"}
+    engine = database.async_engine.sync_engine if database.async_engine is not None else database.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0].upper() + " " + statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        created = client.post("/tasks", json={"title": "Sync inventory", "description": "Nightly job"}, headers=headers)
+        create_sql = list(statements)
+        statements.clear()
+        task_id = created.json()["id"]
+        client.put(f"/tasks/{task_id}", json={"status": "In Progress", "progress": 10}, headers=headers)
+        statements.clear()
+        updated = client.put(f"/tasks/{task_id}", json={"progress": 20, "comment": "Halfway there"}, headers=headers)
+        update_sql = list(statements)
+        statements.clear()
+        acks = [client.put(f"/tasks/{task_id}", json={"progress": p}, headers={**headers, "Prefer": "return=minimal"}) for p in (30, 40)]
+        ack_sql = list(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    print(f"[CREATE SQL] {len(create_sql)} statements; [UPDATE SQL] {len(update_sql)}; [MINIMAL SQL] {len(ack_sql)} for 2 updates")
+
+    def after_task_write(sql, verb):
+        first = next(i for i, stmt in enumerate(sql) if stmt.startswith(verb) and "tasks" in stmt.split("(")[0])
+        return [stmt for stmt in sql[first:] if stmt.startswith("SELECT")]
+
+    assert created.status_code == 200 and updated.status_code == 200
+    assert after_task_write(create_sql, "INSERT") == []
+    assert after_task_write(update_sql, "UPDATE") == []
+    fetched = client.get(f"/tasks/{task_id}", headers=headers).json()
+    # The later minimal updates only moved progress on and appended activity
+    body = updated.json()
+    assert body == {**fetched, "progress": 20, "activity_log": fetched["activity_log"][:len(body["activity_log"])]}
+    assert [c["comment"] for c in updated.json()["comments"]] == ["Halfway there"]
+    assert {a["action"] for a in updated.json()["activity_log"]} >= {"progress_update", "comment"}
+    assert created.json()["created_at"] == fetched["created_at"] and created.json()["comments"] == []
+    for ack in acks:
+        assert ack.status_code == 200 and ack.json() == {"id": task_id, "status": "updated"}
+        assert ack.headers["Preference-Applied"] == "return=minimal"
+    assert len([stmt for stmt in ack_sql if stmt.startswith("SELECT")]) == 2
+    assert fetched["progress"] == 40
+
+def test_write_responses_without_returning_support(monkeypatch):
+    """
+    Test: Without INSERT ... RETURNING, writes still answer without reading anything back.
+    Steps:
+    - Register and login as a legacy client and turn off the dialect's RETURNING support
+    - Bulk create a task and update it with a comment, recording the SQL
+    - Assert no SELECT ran after the first write and the update response equals a later GET
+    - Comment with Prefer: return=minimal and assert the activity endpoint shows it at once
+    """
+    print("\n[TEST] test_write_responses_without_returning_support: Write with RETURNING disabled.")
+    headers = {"Authorization": f"Bearer {get_token('legacyclient', 'Legacy12345!')}"}
+    engine = database.async_engine.sync_engine if database.async_engine is not None else database.engine
+    for flag in ("insert_returning", "insert_executemany_returning", "insert_executemany_returning_sort_by_parameter_order"):
+        monkeypatch.setattr(engine.dialect, flag, False)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        created = client.post("/tasks/bulk", json={"tasks": [{"title": "No RETURNING", "description": "Old database"}]}, headers=headers)
+        task_id = created.json()["results"][0]["id"]
+        client.put(f"/tasks/{task_id}", json={"status": "In Progress"}, headers=headers)
+        statements.clear()
+        updated = client.put(f"/tasks/{task_id}", json={"progress": 50, "comment": "Works without RETURNING"}, headers=headers)
+        update_sql = list(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    print(f"[UPDATE SQL] {update_sql}")
+    # BEGIN IMMEDIATE takes the write lock before the task is read (repository.lock_for_write)
+    first_write = next(i for i, stmt in enumerate(update_sql) if not stmt.startswith(("SELECT", "BEGIN")))
+    assert [stmt for stmt in update_sql[first_write:] if stmt.startswith("SELECT")] == []
+    assert all("RETURNING" not in stmt for stmt in update_sql)
+    fetched = client.get(f"/tasks/{task_id}", headers=headers).json()
+    assert updated.status_code == 200 and updated.json() == fetched
+    assert [c["comment"] for c in fetched["comments"]] == ["Works without RETURNING"]
+    ack = client.put(f"/tasks/{task_id}", json={"comment": "Minimal note"}, headers={**headers, "Prefer": "return=minimal"})
+    assert ack.json() == {"id": task_id, "status": "updated"}
+    activity = client.get(f"/tasks/{task_id}/activity", headers=headers).json()
+    assert activity[-1]["detail"] == "Commented: Minimal note"
+
+def test_async_mode_serves_endpoints_off_the_event_loop():
+    """
+    Test: The asyncified routes serve the API on an AsyncSession.
+    Steps:
+    - Build the async-mode app on its own async engine, as DB_MODE=async does
+    - Register and login as an async tester; create, bulk-update and read a task through it
+    - Assert the responses and that every query, the activity insert included, ran on the
+      event loop thread
+    """
+    print("\n[TEST] test_async_mode_serves_endpoints_off_the_event_loop: Serve requests from the async routes.")
+    from fastapi import FastAPI
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from task_service import main
+    from task_service.async_routes import asyncify_router
+    url = database.SQLALCHEMY_ASYNC_DATABASE_URL
+    async_engine = create_async_engine(url, **database.engine_options(url))
+    sessions = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def get_async_db():
+        async with sessions() as db:
+            yield db
+
+    async_app = FastAPI()
+    async_app.include_router(asyncify_router(main.router, main.get_db, get_async_db, sync_only=main.SYNC_ONLY))
+    headers = {"Authorization": f"Bearer {get_token('asynctester', 'Async12345!')}"}
+    loop_threads, activity_inserts = set(), []
+
+    def on_loop(conn, cursor, statement, parameters, context, executemany):
+        loop_threads.add(threading.get_ident())
+        if statement.startswith("INSERT INTO task_activities"):
+            activity_inserts.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_loop)
+    try:
+        # One portal, so every request is served by the same event loop thread
+        with TestClient(async_app) as async_client:
+            created = async_client.post("/tasks", json={"title": "Async path", "description": "Served by asyncify"}, headers=headers)
+            task_id = created.json()["id"]
+            bulk = async_client.patch("/tasks/bulk", json={"updates": [{"id": task_id, "status": "In Progress"}]}, headers=headers)
+            fetched = async_client.get(f"/tasks/{task_id}", headers=headers)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", on_loop)
+    print(f"[ASYNC APP] created: {created.status_code}, bulk: {bulk.json()}, fetched: {fetched.json()}")
+    print(f"[THREADS] loop: {loop_threads}, activity inserts: {len(activity_inserts)}")
+    assert created.status_code == 200 and [item["status"] for item in bulk.json()["results"]] == ["updated"]
+    assert fetched.status_code == 200 and fetched.json()["status"] == "In Progress"
+    assert [entry["action"] for entry in fetched.json()["activity_log"]] == ["status_change"]
+    assert len(loop_threads) == 1 and activity_inserts
+
+def test_hot_queries_use_indexes():
+    """
+    Test: The task service's hot query shapes are answered from indexes.
+    Steps:
+    - Compile each hot query and run EXPLAIN QUERY PLAN on it
+    - Assert no plan step is a full scan of tasks, task_comments or task_activities
+    """
+    print("\n[TEST] test_hot_queries_use_indexes: EXPLAIN the hot queries and check for full table scans.")
+    Task, Comment, Activity = models.Task, models.TaskComment, models.TaskActivity
+    hot_queries = {
+        "tasks by owner and status": select(Task.id).where(Task.owner == "alice", Task.status == "Done"),
+        "keyset page for owner": select(Task).where(Task.owner == "alice", Task.id > 10).order_by(Task.id).limit(50),
+        "completions since date": select(func.count(Task.id)).where(Task.status == "Done", Task.completed_at >= "2024-01-01"),
+        "comments for tasks": select(Comment).where(Comment.task_id.in_([1, 2, 3])),
+        "activity for tasks": select(Activity).where(Activity.task_id.in_([1, 2, 3])),
+        "comments by user": select(func.count(Comment.id)).where(Comment.user == "alice"),
+        "upcoming for owner": select(Task.id).where(
+            Task.owner == "alice", Task.status.in_(["To Do", "In Progress"]), Task.deadline >= "2024-01-01", Task.deadline < "2024-01-08"
+        ).order_by(Task.deadline, Task.id).limit(50),
+    }
+    full_scan = re.compile(r"^SCAN (tasks|task_comments|task_activities)$")
+    with database.engine.connect() as conn:
+        for name, query in hot_queries.items():
+            sql = str(query.compile(dialect=database.engine.dialect, compile_kwargs={"literal_binds": True}))
+            plan = [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+            print(f"[QUERY PLAN] {name}: {plan}")
+            assert not any(full_scan.match(step) for step in plan), f"{name} does a full table scan: {plan}"
+
 # Access control: user cannot delete others' tasks
 def test_delete_other_user_task_forbidden():
     """
@@ -0,0 +1,106 @@
+import threading
+from datetime import datetime
+from sqlalchemy.orm import Session
+from task_service import models, database, rollups, changes, versions, deadlines, repository
+from user_service import models as user_models, database as user_database
+
+# Tasks (with their comments and activity) removed per transaction
+PURGE_CHUNK_SIZE = 500
+
+# Usernames being purged by this process, so a resume and a request never run the same job twice
+_running = set()
+_running_lock = threading.Lock()
+
+
+def start(db: Session, username: str):
+    """Create (or reset) the deletion job for a user. The job row is what makes a purge resumable."""
+    total = db.query(models.Task.id).filter(models.Task.owner == username).count()
+    job = db.get(models.UserDeletion, username)
+    if job is None:
+        job = models.UserDeletion(username=username)
+        db.add(job)
+    job.status = "running"
+    job.tasks_total = total
+    job.tasks_deleted = 0
+    job.started_at = datetime.utcnow()
+    job.finished_at = None
+    db.commit()
+
+
+def purge_chunk(db: Session, username: str) -> int:
+    """
+    Delete one chunk of the user's tasks and their children in one transaction, holding the
+    write lock from the read on (see repository.lock_for_write).
+    """
+    Task = models.Task
+    repository.lock_for_write(db)
+    rows = db.query(Task.id, Task.owner, Task.status, Task.progress, Task.completed_at).filter(
+        Task.owner == username
+    ).order_by(Task.id).limit(PURGE_CHUNK_SIZE).with_for_update().all()
+    if not rows:
+        db.rollback()
+        return 0
+    commenters = rollups.comments_removed(db, [row.id for row in rows])
+    removed = set(repository.delete_tasks(db, [row.id for row in rows]))
+    rollups.tasks_changed(db, [(rollups.snapshot(row), None) for row in rows if row.id in removed])
+    versions.bump(db, [username, *commenters])
+    job = db.get(models.UserDeletion, username)
+    if job is not None:
+        job.tasks_deleted += len(removed)
+    db.commit()
+    for task_id in removed:
+        deadlines.scheduler.untrack(task_id)
+    return len(removed)
+
+
+def running(username: str) -> bool:
+    """Whether this process is purging the user right now."""
+    with _running_lock:
+        return username in _running
+
+
+def run(username: str) -> bool:
+    """
+    Purge a user's tasks chunk by chunk, then the user row in the user database.
+    The user is removed last, so a purge interrupted at any point is finished by resume_pending().
+    Returns False, without doing anything, when a purge of the user is already running.
+    """
+    with _running_lock:
+        if username in _running:
+            return False
+        _running.add(username)
+    db = database.SessionLocal()
+    user_db = user_database.SessionLocal()
+    try:
+        while purge_chunk(db, username):
+            pass
+        user_db.query(user_models.User).filter(user_models.User.username == username).delete()
+        user_db.commit()
+        job = db.get(models.UserDeletion, username)
+        if job is not None:
+            job.status = "done"
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        changes.publish([changes.event("user.deleted", username, data={"username": username})])
+        return True
+    finally:
+        user_db.close()
+        db.close()
+        with _running_lock:
+            _running.discard(username)
+
+
+def resume_pending():
+    """Finish deletions left running by a process that died part way."""
+    db = database.SessionLocal()
+    try:
+        pending = [job.username for job in db.query(models.UserDeletion).filter(models.UserDeletion.status == "running")]
+    finally:
+        db.close()
+    for username in pending:
+        print("Resuming deletion of user", username)
+        try:
+            run(username)
+        except Exception as e:
+            # Left as running; the next start tries again
+            print("Error resuming deletion of user", username, e)
@@ -0,0 +1,56 @@
+import hashlib
+from typing import Optional
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from task_service import models, dashboard_cache
+
+# Scope of Admin reads that are not filtered by user; its version is derived from every owner's.
+# None rather than a string, so no username can stand for it
+ALL = None
+
+
+def bump(db: Session, owners):
+    """
+    Increment the version of each owner whose tasks, comments or dashboard numbers changed.
+    Runs in the caller's session so it commits together with the write. There is no shared
+    row for ALL, so writes for different owners never contend on one counter.
+    """
+    owners = set(owners)
+    if not owners:
+        return
+    Version = models.OwnerVersion
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    for owner in sorted(owners):
+        stmt = dialect_insert(Version).values(owner=owner, version=1)
+        db.execute(stmt.on_conflict_do_update(index_elements=["owner"], set_={"version": Version.version + 1}))
+    # Cached dashboards are keyed by version, so these entries can no longer be hit; free them now.
+    # ALL entries are left to expire: freeing them on every write would empty them for everyone.
+    dashboard_cache.cache.invalidate(owners)
+
+
+def current(db: Session, scope: Optional[str]):
+    """
+    The scope's version. For ALL it is the sum and count of the owner versions, which changes
+    with every bump; that costs an aggregate over one row per owner on each Admin-wide read.
+    """
+    Version = models.OwnerVersion
+    if scope is ALL:
+        total, owners = db.execute(select(func.coalesce(func.sum(Version.version), 0), func.count())).one()
+        return f"{total}.{owners}"
+    row = db.get(Version, scope)
+    return row.version if row is not None else 0
+
+
+def etag(db: Session, scope: Optional[str], *parts) -> str:
+    """Weak ETag for a representation of `scope`'s data; `parts` tell representations apart."""
+    digest = hashlib.blake2b("|".join(map(str, [scope, *parts])).encode(), digest_size=8).hexdigest()
+    return f'W/"{current(db, scope)}-{digest}"'
+
+
+def matches(if_none_match, tag: str) -> bool:
+    """If-None-Match check with weak comparison (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or tag.removeprefix("W/") in [c.removeprefix("W/") for c in candidates]
@@ -1,10 +1,14 @@
+import threading
 import time
-from fastapi import FastAPI, Depends, HTTPException, status
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from . import models, schemas, database
+from .token_cache import TokenCache
+from . import passwords
 # from user_service import models, schemas, database
 # import models, database, schemas
 
@@ -14,18 +18,51 @@ print(hashed)
 print("-----------------")
 SECRET_KEY = "your-very-secret-key"
 ALGORITHM = "HS256"
+token_cache = TokenCache(SECRET_KEY, ALGORITHM)
 
 models.Base.metadata.create_all(bind=database.engine)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    passwords.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+router = APIRouter()
+async_router = APIRouter()
 print("-----------------",app)
+# Process-level user count cache, dropped on every register in this service.
+# Users deleted through the task service are picked up once the TTL runs out.
+USER_COUNT_TTL = 5.0  # seconds
+_user_count = {"value": None, "expires": 0.0}
+_user_count_lock = threading.Lock()
+
+def has_users(db: Session):
+    return db.query(db.query(models.User.id).exists()).scalar()
+
+def cached_user_count():
+    with _user_count_lock:
+        if _user_count["value"] is not None and _user_count["expires"] > time.monotonic():
+            return _user_count["value"]
+    return None
+
+def store_user_count(count: int):
+    with _user_count_lock:
+        _user_count["value"] = count
+        _user_count["expires"] = time.monotonic() + USER_COUNT_TTL
+    return count
+
 # Helper to count users
 def get_user_count(db: Session):
-    count1=db.query(models.User).count()
-    time.sleep(3)  # Simulate delay
-    print("User count--", count1)
-    return count1
+    count = cached_user_count()
+    if count is None:
+        count = store_user_count(db.query(func.count(models.User.id)).scalar())
+    return count
+
+def invalidate_user_count():
+    with _user_count_lock:
+        _user_count["value"] = None
 
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -52,11 +89,12 @@ def get_user(db: Session, username: str):
     print(models.User.id)
     return db.query(models.User).filter(models.User.username == username).first()
 
+# Password hashing runs on the bounded worker pool in passwords.py
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return passwords.verify_and_update(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return passwords.hash_password(password)
 
 def create_access_token(data: dict):
     return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
@@ -64,8 +102,7 @@ def create_access_token(data: dict):
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(status_code=401, detail="Invalid credentials")
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+        username, _ = token_cache.decode(token)
         if username is None:
             raise credentials_exception
     except JWTError:
@@ -77,10 +114,10 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
 
 
 # Allow first user to register as admin if no users exist
-@app.post("/register", response_model=schemas.UserOut)
+@router.post("/register", response_model=schemas.UserOut)
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     print("user registration attempt:", user.username)
-    if get_user_count(db) > 0:
+    if has_users(db):
         raise HTTPException(status_code=403, detail="Direct registration is disabled. Only Admin can register new users.")
     if get_user(db, user.username):
         raise HTTPException(status_code=400, detail="Username already registered")
@@ -88,16 +125,15 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     user_obj = models.User(username=user.username, hashed_password=hashed_password, role="Admin")
     db.add(user_obj)
     db.commit()
+    invalidate_user_count()
     db.refresh(user_obj)
     return user_obj
 
 # Only allow admin to register new users
-@app.post("/admin/register", response_model=schemas.UserOut)
+@router.post("/admin/register", response_model=schemas.UserOut)
 def admin_register(user: schemas.UserCreate, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        role = payload.get("role", "User")
+        username, role = token_cache.decode(token)
         print("Admin register attempt by:", username, "with role:", role)
         if role != "Admin":
             raise HTTPException(status_code=403, detail="Only Admin can register new users")
@@ -110,24 +146,112 @@ def admin_register(user: schemas.UserCreate, db: Session = Depends(get_db), toke
     user_obj = models.User(username=user.username, hashed_password=hashed_password, role=reg_role)
     db.add(user_obj)
     db.commit()
+    invalidate_user_count()
     db.refresh(user_obj)
     return user_obj
 
-@app.post("/login", response_model=schemas.Token)
+@router.post("/login", response_model=schemas.Token)
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = get_user(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect username or password")
+    valid, new_hash = verify_password(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
+    if new_hash:
+        # Stored hash uses an outdated cost factor; upgrade it transparently
+        user.hashed_password = new_hash
+        db.commit()
     token = create_access_token({"sub": user.username, "role": user.role})
     return {"access_token": token, "token_type": "bearer"}
 
-@app.get("/me", response_model=schemas.UserOut)
+@router.get("/me", response_model=schemas.UserOut)
 def read_me(current_user: models.User = Depends(get_current_user)):
     return current_user
 
-@app.get("/users/count")
+@router.get("/users/count")
 def get_users_count(db: Session = Depends(get_db)):
-    count = db.query(models.User).count()
-    time.sleep(2)  # Simulate delay
-    print("User count-", count)
-    return {"count": count}
\ No newline at end of file
+    return {"count": get_user_count(db)}
+
+
+# --- ASYNC ENDPOINTS (DB_MODE=async) ---
+async def get_async_db():
+    async with database.AsyncSessionLocal() as db:
+        yield db
+
+async def get_user_async(db, username: str):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db=Depends(get_async_db)):
+    credentials_exception = HTTPException(status_code=401, detail="Invalid credentials")
+    try:
+        username, _ = token_cache.decode(token)
+        if username is None:
+            raise credentials_exception
+    except JWTError:
+        raise credentials_exception
+    user = await get_user_async(db, username)
+    if user is None:
+        raise credentials_exception
+    return user
+
+@async_router.post("/register", response_model=schemas.UserOut)
+async def register_async(user: schemas.UserCreate, db=Depends(get_async_db)):
+    if await db.scalar(select(select(models.User.id).exists())):
+        raise HTTPException(status_code=403, detail="Direct registration is disabled. Only Admin can register new users.")
+    if await get_user_async(db, user.username):
+        raise HTTPException(status_code=400, detail="Username already registered")
+    hashed_password = await passwords.hash_password_async(user.password)
+    user_obj = models.User(username=user.username, hashed_password=hashed_password, role="Admin")
+    db.add(user_obj)
+    await db.commit()
+    await db.refresh(user_obj)
+    invalidate_user_count()
+    return user_obj
+
+@async_router.post("/admin/register", response_model=schemas.UserOut)
+async def admin_register_async(user: schemas.UserCreate, db=Depends(get_async_db), token: str = Depends(oauth2_scheme)):
+    try:
+        username, role = token_cache.decode(token)
+        if role != "Admin":
+            raise HTTPException(status_code=403, detail="Only Admin can register new users")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if await get_user_async(db, user.username):
+        raise HTTPException(status_code=400, detail="Username already registered")
+    hashed_password = await passwords.hash_password_async(user.password)
+    user_obj = models.User(username=user.username, hashed_password=hashed_password, role=getattr(user, "role", "User"))
+    db.add(user_obj)
+    await db.commit()
+    await db.refresh(user_obj)
+    invalidate_user_count()
+    return user_obj
+
+@async_router.post("/login", response_model=schemas.Token)
+async def login_async(form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get_async_db)):
+    user = await get_user_async(db, form_data.username)
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect username or password")
+    valid, new_hash = await passwords.verify_and_update_async(form_data.password, user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=400, detail="Incorrect username or password")
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    token = create_access_token({"sub": user.username, "role": user.role})
+    return {"access_token": token, "token_type": "bearer"}
+
+@async_router.get("/me", response_model=schemas.UserOut)
+async def read_me_async(current_user: models.User = Depends(get_current_user_async)):
+    return current_user
+
+@async_router.get("/users/count")
+async def get_users_count_async(db=Depends(get_async_db)):
+    count = cached_user_count()
+    if count is None:
+        count = store_user_count(await db.scalar(select(func.count(models.User.id))))
+    return {"count": count}
+
+
+app.include_router(async_router if database.DB_MODE == "async" else router)
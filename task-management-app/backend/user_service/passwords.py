@@ -0,0 +1,84 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+# bcrypt cost factor; hashes made with a different cost are upgraded on the next login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+# Worker processes for hashing, and how many more requests may wait for one before we shed load
+PASSWORD_WORKERS = int(os.environ.get("PASSWORD_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_QUEUE_DEPTH = int(os.environ.get("PASSWORD_QUEUE_DEPTH", "16"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+# Caps password jobs in flight (running + queued), which also caps the request threads waiting on them
+_slots = threading.BoundedSemaphore(PASSWORD_WORKERS + PASSWORD_QUEUE_DEPTH)
+
+
+def _hash(password: str):
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS)
+        return _pool
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    try:
+        return _get_pool().submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+async def _run_async(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    try:
+        return await asyncio.wrap_future(_get_pool().submit(fn, *args))
+    finally:
+        _slots.release()
+
+
+def hash_password(password: str) -> str:
+    return _run(_hash, password)
+
+
+def verify_and_update(password: str, hashed_password: str):
+    """Returns (valid, new_hash); new_hash is set when the stored hash uses an outdated cost."""
+    return _run(_verify_and_update, password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_async(_hash, password)
+
+
+async def verify_and_update_async(password: str, hashed_password: str):
+    return await _run_async(_verify_and_update, password, hashed_password)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
@@ -2,7 +2,7 @@ ADMIN_USERNAME = "testuser1"
 ADMIN_PASSWORD = "TestPass123!"
 import pytest
 from fastapi.testclient import TestClient
-from .main import app
+from .main import app, token_cache
 
 client = TestClient(app)
 
@@ -93,6 +93,26 @@ def test_read_me():
     assert response.status_code == 200
     assert response.json()["username"] == ADMIN_USERNAME
 
+def test_token_cache_reuses_verified_token():
+    print("\n[TEST] test_token_cache_reuses_verified_token: Login as admin, call /me twice and check the second call hits the token cache.")
+    client.post("/register", json={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+    login = client.post(
+        "/login",
+        data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD},
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    token = login.json()["access_token"]
+    client.get("/me", headers={"Authorization": f"Bearer {token}"})
+    before = token_cache.stats()
+    response = client.get("/me", headers={"Authorization": f"Bearer {token}"})
+    after = token_cache.stats()
+    print(f"[TOKEN CACHE] before: {before}, after: {after}")
+    assert response.status_code == 200
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"]
+    bad = client.get("/me", headers={"Authorization": f"Bearer {token}x"})
+    assert bad.status_code == 401
+
 def test_admin_register_and_role():
     print("\n[TEST] test_admin_register_and_role: Register admin, login, and register a new user as admin, checking roles.")
     # Register first user (admin)
@@ -163,3 +183,65 @@ def test_users_count_endpoint():
     print(f"[GET /users/count] status:", response.status_code, response.json())
     assert response.status_code == 200
     assert "count" in response.json()
+
+def test_users_count_refreshes_after_register():
+    print("\n[TEST] test_users_count_refreshes_after_register: Read cached /users/count, register a user as admin, and expect the count to move immediately.")
+    client.post("/register", json={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+    login = client.post(
+        "/login",
+        data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD},
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    token = login.json()["access_token"]
+    before = client.get("/users/count").json()["count"]
+    response = client.post(
+        "/admin/register",
+        json={"username": "countuser", "password": "CountPass1!", "role": "User"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    print(f"[ADMIN REGISTER] (countuser) status:", response.status_code, response.json())
+    after = client.get("/users/count").json()["count"]
+    print(f"[GET /users/count] before: {before}, after: {after}")
+    if response.status_code == 200:
+        assert after == before + 1
+    else:
+        assert after == before
+
+def test_login_rehashes_outdated_cost():
+    print("\n[TEST] test_login_rehashes_outdated_cost: Store a user hashed with a low bcrypt cost, login, and expect the hash to be upgraded.")
+    from passlib.context import CryptContext
+    from . import database, models, passwords
+    username = "lowcostuser"
+    password = "LowCost123!"
+    db = database.SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.username == username).first()
+        if user is None:
+            user = models.User(username=username, hashed_password="", role="User")
+            db.add(user)
+        user.hashed_password = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4).hash(password)
+        db.commit()
+    finally:
+        db.close()
+    response = client.post("/login", data={"username": username, "password": password})
+    print(f"[LOGIN] ({username}) status:", response.status_code, response.json())
+    assert response.status_code == 200
+    db = database.SessionLocal()
+    try:
+        stored = db.query(models.User).filter(models.User.username == username).first().hashed_password
+    finally:
+        db.close()
+    print(f"[STORED HASH] ({username}):", stored[:7])
+    assert stored.startswith(f"$2b${passwords.BCRYPT_ROUNDS:02d}$")
+
+def test_login_sheds_load_when_password_pool_full(monkeypatch):
+    print("\n[TEST] test_login_sheds_load_when_password_pool_full: With no free password slots, login should answer 503.")
+    import threading
+    from . import passwords
+    monkeypatch.setattr(passwords, "_slots", threading.BoundedSemaphore(1))
+    passwords._slots.acquire()
+    client.post("/register", json={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+    response = client.post("/login", data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+    print(f"[LOGIN WHILE BUSY] status:", response.status_code, response.json())
+    assert response.status_code == 503
+    assert response.headers.get("retry-after") == "1"
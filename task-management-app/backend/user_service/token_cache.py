@@ -0,0 +1,66 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from jose import jwt
+
+DEFAULT_MAXSIZE = 4096
+DEFAULT_TTL = 300  # seconds
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified JWTs, keyed by a SHA-256 digest of the token.
+    Entries hold the decoded (username, role) and expire after `ttl` seconds or at the
+    token's own `exp`, whichever comes first. Safe to share between threadpool workers.
+    """
+
+    def __init__(self, secret_key: str, algorithm: str, maxsize: int = DEFAULT_MAXSIZE, ttl: int = DEFAULT_TTL):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, token: str):
+        """Return (username, role) for a valid token; raises JWTError like jwt.decode."""
+        key = hashlib.sha256(token.encode()).hexdigest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+        payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        identity = (payload.get("sub"), payload.get("role", "User"))
+        expires = now + self.ttl
+        if payload.get("exp") is not None:
+            expires = min(expires, float(payload["exp"]))
+        with self._lock:
+            self._entries[key] = (expires, identity)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return identity
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
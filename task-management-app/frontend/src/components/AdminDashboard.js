@@ -17,19 +17,14 @@ const AdminDashboard = ({ token, selectedUser }) => {
     if (!token) return;
     setLoading(true);
     const params = selectedUser ? { user: selectedUser.username } : {};
-    Promise.all([
-      axios.get("http://localhost:8001/dashboard/status", { headers: { Authorization: `Bearer ${token}` }, params }),
-      axios.get("http://localhost:8001/dashboard/productivity", { headers: { Authorization: `Bearer ${token}` }, params }),
-      axios.get("http://localhost:8001/dashboard/progress", { headers: { Authorization: `Bearer ${token}` }, params }),
-      axios.get("http://localhost:8001/dashboard/upcoming", { headers: { Authorization: `Bearer ${token}` }, params }),
-      axios.get("http://localhost:8001/dashboard/user_summary", { headers: { Authorization: `Bearer ${token}` }, params })
-    ])
-      .then(([statusRes, prodRes, progRes, upcRes, userSumRes]) => {
-        setStatusData(statusRes.data);
-        setProductivityData(prodRes.data);
-        setProgressData(progRes.data);
-        setUpcomingTasks(upcRes.data);
-        setUserSummary(userSumRes.data);
+    // All widgets in one request
+    axios.get("http://localhost:8001/dashboard", { headers: { Authorization: `Bearer ${token}` }, params })
+      .then(res => {
+        setStatusData(res.data.status);
+        setProductivityData(res.data.productivity);
+        setProgressData(res.data.progress);
+        setUpcomingTasks(res.data.upcoming);
+        setUserSummary(res.data.user_summary);
       })
       .finally(() => setLoading(false));
   }, [token, selectedUser]);
@@ -2,6 +2,13 @@ import React, { useState, useEffect } from "react";
 import axios from "axios";
 import { Box, Button, TextField, MenuItem, CircularProgress, Autocomplete, Snackbar, Alert, Card, CardContent, Typography, Divider } from "@mui/material";
 
+// Deadlines are stored as naive UTC; the input works in local time
+const toLocalInput = (deadline) => {
+  if (!deadline) return "";
+  const d = new Date(deadline + "Z");
+  return new Date(d.getTime() - d.getTimezoneOffset() * 60000).toISOString().slice(0, 16);
+};
+
 const TaskCreate = ({ onTaskCreated, initialTask, isAdmin, users, onCancel }) => {
   const isEdit = !!initialTask;
   const [newTask, setNewTask] = useState({
@@ -10,7 +17,8 @@ const TaskCreate = ({ onTaskCreated, initialTask, isAdmin, users, onCancel }) =>
     status: initialTask?.status || "To Do",
     progress: initialTask?.progress ?? 0,
     id: initialTask?.id,
-    owner: initialTask?.owner || ""
+    owner: initialTask?.owner || "",
+    deadline: toLocalInput(initialTask?.deadline)
   });
   const [loading, setLoading] = useState(false);
   const [snackbar, setSnackbar] = useState({ open: false, message: "", severity: "success" });
@@ -42,10 +50,11 @@ const TaskCreate = ({ onTaskCreated, initialTask, isAdmin, users, onCancel }) =>
         status: initialTask.status || "To Do",
         progress: initialTask.progress ?? 0,
         id: initialTask.id,
-        owner: initialTask.owner || ""
+        owner: initialTask.owner || "",
+        deadline: toLocalInput(initialTask.deadline)
       });
     } else {
-      setNewTask({ title: "", description: "", status: "To Do", progress: 0, owner: "" });
+      setNewTask({ title: "", description: "", status: "To Do", progress: 0, owner: "", deadline: "" });
     }
     setComment("");
   }, [initialTask]);
@@ -72,6 +81,13 @@ const TaskCreate = ({ onTaskCreated, initialTask, isAdmin, users, onCancel }) =>
       if (payload.status !== "In Progress") {
         delete payload.progress;
       }
+      if (payload.deadline) {
+        payload.deadline = new Date(payload.deadline).toISOString();
+      } else if (isEdit && initialTask.deadline) {
+        payload.deadline = null;
+      } else {
+        delete payload.deadline;
+      }
       if (isEdit && comment) {
         payload.comment = comment;
       }
@@ -149,6 +165,15 @@ const TaskCreate = ({ onTaskCreated, initialTask, isAdmin, users, onCancel }) =>
         <MenuItem value="In Progress">In Progress</MenuItem>
         <MenuItem value="Done">Done</MenuItem>
       </TextField>
+      <TextField
+        type="datetime-local"
+        name="deadline"
+        label="Deadline"
+        value={newTask.deadline}
+        onChange={handleChange}
+        InputLabelProps={{ shrink: true }}
+        disabled={isNormalUserEdit}
+      />
       {/* Allow normal users to update progress for their assigned tasks when editing */}
       {((isNormalUserEdit && newTask.status === "In Progress") || (isAdmin && newTask.status === "In Progress")) && (
         <TextField
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import axios from "axios";
 import TaskCreate from "./TaskCreate";
 import AdminDashboard from "./AdminDashboard";
@@ -72,6 +72,9 @@ const TaskList = () => {
   const [showUserTasks, setShowUserTasks] = useState(false);
   const [showDashboard, setShowDashboard] = useState(true); // Default to dashboard
   const [showDeleteUser, setShowDeleteUser] = useState(false);
+  const [reloadKey, setReloadKey] = useState(0);
+  const [searchInput, setSearchInput] = useState("");
+  const [searchQuery, setSearchQuery] = useState("");
   const theme = useTheme();
   const isMobile = useMediaQuery(theme.breakpoints.down("sm"));
 
@@ -102,6 +105,20 @@ const TaskList = () => {
     }
   }, [isAdmin, token]);
 
+  // Fetch comments and activity for one task in a single batch request
+  const fetchTaskDetails = (taskId) => {
+    axios.post("http://localhost:8001/tasks/batch", { ids: [taskId], include: ["comments", "activity"] }, { headers: { Authorization: `Bearer ${token}` } })
+      .then(r => {
+        const details = r.data[taskId] || {};
+        setComments(details.comments || []);
+        setActivity(details.activity || []);
+      })
+      .catch(() => {
+        setComments([]);
+        setActivity([]);
+      });
+  };
+
   // Fetch tasks
   useEffect(() => {
     if (!token) {
@@ -114,6 +131,12 @@ const TaskList = () => {
     if (isAdmin && selectedUser) {
       params.user = selectedUser.username;
     }
+    if (searchQuery) {
+      // Ranked full-text matches instead of the full list
+      url = "http://localhost:8001/tasks/search";
+      params.q = searchQuery;
+      params.limit = 100;
+    }
     axios
       .get(url, {
         headers: { Authorization: `Bearer ${token}` },
@@ -137,12 +160,7 @@ const TaskList = () => {
           if (newIdx >= res.data.length) newIdx = res.data.length - 1;
           if (newIdx < 0) newIdx = 0;
           const task = res.data[newIdx];
-          axios.get(`http://localhost:8001/tasks/${task.id}/comments`, { headers: { Authorization: `Bearer ${token}` } })
-            .then(r => setComments(r.data))
-            .catch(() => setComments([]));
-          axios.get(`http://localhost:8001/tasks/${task.id}/activity`, { headers: { Authorization: `Bearer ${token}` } })
-            .then(r => setActivity(r.data))
-            .catch(() => setActivity([]));
+          fetchTaskDetails(task.id);
         }
       })
       .catch(() => {
@@ -151,6 +169,45 @@ const TaskList = () => {
         setActivity([]);
       })
       .finally(() => setLoading(false));
+  }, [token, isAdmin, selectedUser, reloadKey, searchQuery]);
+
+  const selectedTaskId = tasks[selectedTaskIdx] ? tasks[selectedTaskIdx].id : null;
+  const selectedTaskIdRef = useRef(selectedTaskId);
+  selectedTaskIdRef.current = selectedTaskId;
+
+  // Apply task/comment/activity deltas from the change feed instead of refetching.
+  // EventSource reconnects on its own and resumes from the last event id it saw.
+  useEffect(() => {
+    if (!token) return;
+    const params = new URLSearchParams({ token });
+    if (isAdmin && selectedUser) params.set("user", selectedUser.username);
+    const source = new EventSource(`http://localhost:8001/tasks/changes?${params}`);
+    const onTask = (e) => {
+      const event = JSON.parse(e.data);
+      setTasks(prev => {
+        if (event.type === "task.deleted") return prev.filter(t => t.id !== event.task_id);
+        if (!prev.some(t => t.id === event.task_id)) return [...prev, { comments: [], activity_log: [], ...event.data }];
+        return prev.map(t => (t.id === event.task_id ? { ...t, ...event.data } : t));
+      });
+    };
+    const onChild = (setter) => (e) => {
+      const event = JSON.parse(e.data);
+      if (event.task_id !== selectedTaskIdRef.current) return;
+      setter(prev => [...prev, { timestamp: event.ts, ...event.data }]);
+    };
+    const onUserDeleted = (e) => {
+      const event = JSON.parse(e.data);
+      setTasks(prev => prev.filter(t => t.owner !== event.owner));
+    };
+    source.addEventListener("task.created", onTask);
+    source.addEventListener("task.updated", onTask);
+    source.addEventListener("task.deleted", onTask);
+    source.addEventListener("comment.created", onChild(setComments));
+    source.addEventListener("activity.created", onChild(setActivity));
+    source.addEventListener("user.deleted", onUserDeleted);
+    // The server no longer has our offset; reload once and continue from the live feed
+    source.addEventListener("reset", () => setReloadKey(k => k + 1));
+    return () => source.close();
   }, [token, isAdmin, selectedUser]);
 
   // Fetch comments and activity for the selected task
@@ -170,13 +227,8 @@ const TaskList = () => {
       setActivity([]);
       return;
     }
-    axios.get(`http://localhost:8001/tasks/${task.id}/comments`, { headers: { Authorization: `Bearer ${token}` } })
-      .then(r => setComments(r.data))
-      .catch(() => setComments([]));
-    axios.get(`http://localhost:8001/tasks/${task.id}/activity`, { headers: { Authorization: `Bearer ${token}` } })
-      .then(r => setActivity(r.data))
-      .catch(() => setActivity([]));
-  }, [selectedTaskIdx, tasks, token]);
+    fetchTaskDetails(task.id);
+  }, [selectedTaskId, token]);
 
   // Tab switching handler
   const handleTabClick = (event, idx) => {
@@ -186,12 +238,7 @@ const TaskList = () => {
     // Fetch comments and activity for the selected task
     const task = tasks[idx];
     if (task && task.id) {
-      axios.get(`http://localhost:8001/tasks/${task.id}/comments`, { headers: { Authorization: `Bearer ${token}` } })
-        .then(res => setComments(res.data))
-        .catch(() => setComments([]));
-      axios.get(`http://localhost:8001/tasks/${task.id}/activity`, { headers: { Authorization: `Bearer ${token}` } })
-        .then(res => setActivity(res.data))
-        .catch(() => setActivity([]));
+      fetchTaskDetails(task.id);
     } else {
       setComments([]);
       setActivity([]);
@@ -325,6 +372,25 @@ const TaskList = () => {
         {isAdmin && showDashboard && (
           <AdminDashboard token={token} selectedUser={selectedUser} />
         )}
+        {!showDashboard && !isAddMode && ((isAdmin && selectedUser) || !isAdmin) && (
+          <TextField
+            label="Search tasks and comments"
+            size="small"
+            fullWidth
+            value={searchInput}
+            onChange={e => {
+              setSearchInput(e.target.value);
+              if (!e.target.value) setSearchQuery("");
+            }}
+            onKeyDown={e => {
+              if (e.key === "Enter") {
+                setSearchQuery(searchInput.trim());
+                setSelectedTaskIdx(0);
+              }
+            }}
+            sx={{ mb: 2 }}
+          />
+        )}
         {/* Tabs for each task for selected user (admin) or self (user) */}
         {!showDashboard && !isAddMode && ((isAdmin && selectedUser) || !isAdmin) && (
           <Tabs
@@ -350,7 +416,7 @@ const TaskList = () => {
           </Tabs>
         )}
         {/* Show selected task details (for both users and admins) */}
-  {tasks.length > 0 && !showForm && !showDashboard && ((isAdmin && selectedUser) || !isAdmin) && (
+  {tasks[selectedTaskIdx] && !showForm && !showDashboard && ((isAdmin && selectedUser) || !isAdmin) && (
           <Card sx={{ mb: 3, boxShadow: 3, borderRadius: 3 }}>
             <CardContent>
               <Typography variant="h6" color="primary" gutterBottom>{tasks[selectedTaskIdx].title}</Typography>
@@ -370,8 +436,8 @@ const TaskList = () => {
                 <CardContent>
                   <Typography variant="subtitle1" color="primary" gutterBottom>Comments</Typography>
                   {comments.length === 0 && <Typography color="text.secondary">No comments yet.</Typography>}
-                  {comments.map(c => (
-                    <Box key={c.id} sx={{ mb: 1, pl: 1, borderLeft: "3px solid #e0e7ef" }}>
+                  {comments.map((c, i) => (
+                    <Box key={c.id || `new-${i}`} sx={{ mb: 1, pl: 1, borderLeft: "3px solid #e0e7ef" }}>
                       <Typography variant="body2"><b>{c.user}</b> <span style={{ color: '#888', fontSize: 12 }}>({new Date(c.timestamp).toLocaleString()})</span></Typography>
                       <Typography variant="body2">{c.comment}</Typography>
                     </Box>
@@ -379,8 +445,8 @@ const TaskList = () => {
                   <Divider sx={{ my: 2 }} />
                   <Typography variant="subtitle1" color="primary" gutterBottom>Activity Log</Typography>
                   {activity.length === 0 && <Typography color="text.secondary">No activity yet.</Typography>}
-                  {activity.map(a => (
-                    <Box key={a.id} sx={{ mb: 1, pl: 1, borderLeft: "3px solid #e0e7ef" }}>
+                  {activity.map((a, i) => (
+                    <Box key={a.id || `new-${i}`} sx={{ mb: 1, pl: 1, borderLeft: "3px solid #e0e7ef" }}>
                       <Typography variant="body2"><b>{a.user}</b> <span style={{ color: '#888', fontSize: 12 }}>({new Date(a.timestamp).toLocaleString()})</span></Typography>
                       <Typography variant="body2">[{a.action}] {a.detail}</Typography>
                     </Box>
@@ -397,22 +463,9 @@ const TaskList = () => {
               <TaskCreate
                 onTaskCreated={() => {
                   setShowForm(false);
+                  // The change feed delivers the new or edited task; select a new one once it arrives
+                  if (!selectedTask) setSelectedTaskIdx(tasks.length);
                   setSelectedTask(null);
-                  // Refresh tasks after creation or edit
-                  let url = "http://localhost:8001/tasks";
-                  let params = {};
-                  if (isAdmin && selectedUser) {
-                    params.user = selectedUser.username;
-                  }
-                  axios
-                    .get(url, {
-                      headers: { Authorization: `Bearer ${token}` },
-                      params,
-                    })
-                    .then((res) => {
-                      setTasks(res.data);
-                      setSelectedTaskIdx(res.data.length > 0 ? res.data.length - 1 : 0);
-                    });
                 }}
                 onCancel={() => {
                   setShowForm(false);